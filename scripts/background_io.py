@@ -0,0 +1,175 @@
+"""
+Перекрытие ввода-вывода с расчётом.
+
+На сетевых дисках большая часть времени пересчёта — ожидание чтения
+табелей и записи выходных файлов. Модуль даёт две вещи:
+
+- load_files_concurrently — чтение нескольких входных файлов параллельно;
+- BackgroundWriter — пул потоков, которому расчёт отдаёт готовые данные:
+  сериализация, необязательное сжатие (gzip, brotli) и запись идут
+  в фоне, а расчёт продолжается сразу.
+
+Каждый файл пишется во временный файл в том же каталоге и затем атомарно
+подменяется через os.replace: читатель видит либо старую, либо новую
+версию целиком. Сжатые копии пишутся рядом (.json.gz, .json.br) — их
+отдаёт веб-сервер как предварительно сжатые, исходный файл остаётся.
+
+Данные, переданные писателю, нельзя изменять до flush(): сериализация
+идёт в другом потоке.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # brotli не входит в стандартную библиотеку
+    brotli = None
+
+DEFAULT_IO_WORKERS = 4
+
+# Метод сжатия -> суффикс сжатой копии
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+# umask процесса: читается один раз при импорте, пока нет потоков записи
+# (os.umask меняет его для всего процесса)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def available_compressions() -> list:
+    """Методы сжатия, доступные в текущем окружении."""
+    return [method for method in COMPRESSION_SUFFIXES if method != "br" or brotli is not None]
+
+
+def load_files_concurrently(loader, paths: list, max_workers: int = None) -> list:
+    """Загружает файлы параллельно; результаты в порядке paths."""
+    with ThreadPoolExecutor(max_workers=max_workers or len(paths) or 1) as pool:
+        return list(pool.map(loader, paths))
+
+
+def check_compressions(methods: list) -> None:
+    """Проверяет методы сжатия до начала расчёта; ValueError — метод неизвестен или недоступен."""
+    for method in methods:
+        if method not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Неизвестный метод сжатия: {method}")
+        if method not in available_compressions():
+            raise ValueError(f"Сжатие {method} недоступно: не установлен модуль brotli")
+
+
+def compress_bytes(data: bytes, method: str) -> bytes:
+    if method == "gzip":
+        # mtime=0 — одинаковые данные дают одинаковый архив
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if method == "br":
+        if brotli is None:
+            raise ValueError("Сжатие brotli недоступно: не установлен модуль brotli")
+        return brotli.compress(data)
+    raise ValueError(f"Неизвестный метод сжатия: {method}")
+
+
+def atomic_write_bytes(filepath: Path, data: bytes) -> None:
+    """
+    Записывает файл через временный файл и os.replace.
+
+    mkstemp создаёт файл с правами 0600, поэтому перед подменой ему даются
+    права прежнего файла, а новому файлу — обычные 0666 с учётом umask:
+    иначе опубликованные файлы станут недоступны веб-серверу и зеркалам.
+    """
+    filepath = Path(filepath)
+    try:
+        mode = filepath.stat().st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def serialize_json(data, compact: bool = False) -> bytes:
+    """Сериализация так же, как save_json / save_compact_json."""
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    return text.encode('utf-8')
+
+
+class BackgroundWriter:
+    """
+    Фоновая запись выходных файлов пулом потоков.
+
+    submit_* возвращают управление сразу; flush() дожидается всех записей
+    и пробрасывает первую ошибку. Используется как контекстный менеджер.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_IO_WORKERS, compress: list = ()):
+        check_compressions(compress)
+        self.compress = list(compress)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="writer")
+        self._pending = []
+
+    def submit_json(self, filepath: Path, data, compact: bool = False):
+        return self._submit(filepath, lambda: serialize_json(data, compact))
+
+    def submit_bytes(self, filepath: Path, data: bytes):
+        return self._submit(filepath, lambda: data)
+
+    def _submit(self, filepath: Path, serialize):
+        future = self._pool.submit(self._write, Path(filepath), serialize)
+        self._pending.append(future)
+        return future
+
+    def _write(self, filepath: Path, serialize) -> None:
+        payload = serialize()
+        atomic_write_bytes(filepath, payload)
+        for method in self.compress:
+            compressed_path = filepath.with_name(filepath.name + COMPRESSION_SUFFIXES[method])
+            atomic_write_bytes(compressed_path, compress_bytes(payload, method))
+
+    def flush(self) -> None:
+        """Дожидается всех отправленных записей; ошибка записи пробрасывается."""
+        pending, self._pending = self._pending, []
+        errors = [future.exception() for future in pending]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def close_after_error(self) -> None:
+        """
+        Закрывает писатель, когда расчёт уже упал: дописывает начатое и
+        сообщает об ошибках записи, не подменяя ими ошибку расчёта.
+        """
+        self._pool.shutdown(wait=True)
+        pending, self._pending = self._pending, []
+        for future in pending:
+            error = future.exception()
+            if error is not None:
+                print(f"  Ошибка фоновой записи: {error!r}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.close_after_error()
+        return False
@@ -0,0 +1,136 @@
+"""
+Контрольные точки этапов пересчёта.
+
+Полный пересчёт по всей компании может упасть на середине (нехватка
+памяти, остановленный CI) — без контрольных точек он начинается заново
+с чтения JSON. CheckpointStore сохраняет результат каждого завершённого
+этапа, и повторный запуск продолжает с первого незавершённого.
+
+Контрольная точка привязана к отпечатку входа: содержимому входных
+файлов, коду расчёта и параметрам. При другом отпечатке точка устарела
+и удаляется; точка с неверной контрольной суммой или нечитаемыми данными
+считается повреждённой и тоже удаляется — этап пересчитывается.
+
+Формат файла <этап>.ckpt (little-endian):
+    b"ITRK" | версия u16 | отпечаток входа (32 байта) | SHA-256 данных (32 байта) | данные
+Данные — marshal результата этапа, сжатый zlib. marshal хранит только
+встроенные типы (dict, list, tuple, set, числа, строки), поэтому этапы
+передают функции encode/decode для своих структур.
+"""
+
+import hashlib
+import json
+import marshal
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+from background_io import atomic_write_bytes
+
+CHECKPOINT_MAGIC = b"ITRK"
+CHECKPOINT_FORMAT_VERSION = 1
+CHECKPOINT_SUFFIX = ".ckpt"
+
+_HEADER = struct.Struct('<4sH32s32s')
+_HASH_CHUNK = 1 << 20
+
+
+def _hash_file(digest, filepath: Path) -> None:
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+
+
+def input_fingerprint(files: list, params: dict) -> bytes:
+    """Отпечаток входа: содержимое файлов, параметры расчёта и версия формата."""
+    digest = hashlib.sha256()
+    # marshal меняет формат между версиями Python
+    digest.update(f"{CHECKPOINT_FORMAT_VERSION}:{sys.version_info[:2]}".encode())
+    digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    for filepath in files:
+        digest.update(Path(filepath).name.encode('utf-8') + b"\0")
+        _hash_file(digest, filepath)
+    return digest.digest()
+
+
+def to_plain(value):
+    """Приводит вложенные defaultdict к dict (marshal не сохраняет подклассы)."""
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(to_plain(item) for item in value)
+    return value
+
+
+class CheckpointStore:
+    """Контрольные точки этапов в каталоге directory для заданного отпечатка входа."""
+
+    def __init__(self, directory: Path, fingerprint: bytes):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+
+    def _path(self, stage: str) -> Path:
+        return self.directory / f"{stage}{CHECKPOINT_SUFFIX}"
+
+    def _discard(self, stage: str, reason: str) -> None:
+        print(f"  Контрольная точка {stage} {reason} — этап будет пересчитан")
+        self._path(stage).unlink(missing_ok=True)
+
+    def load(self, stage: str) -> tuple:
+        """(True, значение) для действительной точки, иначе (False, None)."""
+        path = self._path(stage)
+        if not path.exists():
+            return False, None
+        data = path.read_bytes()
+        if len(data) < _HEADER.size:
+            self._discard(stage, "повреждена")
+            return False, None
+
+        magic, version, fingerprint, checksum = _HEADER.unpack_from(data)
+        if magic != CHECKPOINT_MAGIC:
+            self._discard(stage, "повреждена")
+            return False, None
+        if version != CHECKPOINT_FORMAT_VERSION or fingerprint != self.fingerprint:
+            self._discard(stage, "устарела")
+            return False, None
+
+        payload = data[_HEADER.size:]
+        if hashlib.sha256(payload).digest() != checksum:
+            self._discard(stage, "повреждена")
+            return False, None
+        try:
+            return True, marshal.loads(zlib.decompress(payload))
+        except (ValueError, EOFError, TypeError, zlib.error):
+            self._discard(stage, "повреждена")
+            return False, None
+
+    def save(self, stage: str, value) -> None:
+        payload = zlib.compress(marshal.dumps(value), 6)
+        header = _HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_FORMAT_VERSION, self.fingerprint,
+                              hashlib.sha256(payload).digest())
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(self._path(stage), header + payload)
+
+    def stage(self, stage: str, compute, encode=None, decode=None):
+        """
+        Результат этапа из контрольной точки или compute() с сохранением точки.
+
+        encode/decode переводят результат этапа во встроенные типы и обратно.
+        """
+        found, value = self.load(stage)
+        if found:
+            print(f"  Этап {stage}: восстановлен из контрольной точки")
+            return decode(value) if decode is not None else value
+
+        result = compute()
+        self.save(stage, encode(result) if encode is not None else result)
+        return result
+
+    def clear(self) -> None:
+        """Удаляет все контрольные точки каталога (после успешного пересчёта)."""
+        if self.directory.exists():
+            for path in self.directory.glob(f"*{CHECKPOINT_SUFFIX}"):
+                path.unlink()
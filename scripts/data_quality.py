@@ -0,0 +1,212 @@
+"""
+Проверка качества табельных данных (ИТР и рабочие).
+
+Плохие строки незаметно искажают K: дубли табельного номера в одном
+проекте-месяце, аномальные часы, неизвестные месяцы, человек, который
+числится одновременно ИТР и рабочим. Валидатор встраивается в цикл
+группировки `calculate_monthly_stats`: на каждую запись он выполняет
+только O(1) проверки и дописывает коды в колоночные массивы, а проверки,
+требующие сравнения строк между собой, выполняются одной сортировкой
+в `finalize()` — без отдельного прохода на каждое правило.
+
+При расчёте вне памяти колонки не накапливаются (keep_rows=False):
+дубли ищутся внутри партиции проекта (`iter_checking_duplicates`), а
+совпадения ИТР и рабочих — внутри партиции по (месяц, человек)
+(`check_itr_and_worker`). Отчёт в обоих режимах одинаков: в примеры
+строк попадают первые по номеру строки каждого источника.
+"""
+
+import heapq
+from array import array
+from collections import Counter
+
+# Часы за месяц, начиная с которых запись считается подозрительной
+SUSPICIOUS_MONTHLY_HOURS = 300
+
+# Сколько ссылок на строки сохранять в отчёте для каждого типа проблемы
+DEFAULT_SAMPLE_LIMIT = 50
+
+ISSUE_DESCRIPTIONS = {
+    "duplicate_personnel": "Табельный номер повторяется в одном проекте-месяце",
+    "excessive_hours": f"Часов за месяц >= {SUSPICIOUS_MONTHLY_HOURS}",
+    "negative_hours": "Отрицательное количество часов",
+    "unknown_month": "Месяц вне MONTHS_ORDER",
+    "itr_and_worker": "Человек в одном месяце числится и ИТР, и рабочим",
+}
+
+
+class TimesheetValidator:
+    """
+    Накопитель проверок для одного прохода группировки.
+
+    Значения проекта, месяца и табельного номера кодируются целыми числами
+    (интернирование через словари), строки хранятся в `array` по источникам.
+    Номер строки — это позиция записи во входном файле источника.
+    """
+
+    def __init__(self, known_months: list, max_hours: int = SUSPICIOUS_MONTHLY_HOURS,
+                 sample_limit: int = DEFAULT_SAMPLE_LIMIT, keep_rows: bool = True):
+        self.month_codes = {month: idx for idx, month in enumerate(known_months)}
+        self.known_months_count = len(self.month_codes)
+        self.max_hours = max_hours
+        self.sample_limit = sample_limit
+        self.keep_rows = keep_rows
+
+        self._projects = {}
+        self._personnel = {}
+        self._columns = {}
+        self._rows_checked = Counter()
+        self._source_order = {}
+        self._counts = Counter()
+        # Куча (-источник, -строка, пример): в ней остаются sample_limit первых строк
+        self._samples = {issue: [] for issue in ISSUE_DESCRIPTIONS}
+        self._project_names = []
+        self._month_names = {}
+
+    def _source_columns(self, source: str) -> dict:
+        columns = self._columns.get(source)
+        if columns is None:
+            columns = {
+                'project': array('q'),
+                'month': array('q'),
+                'personnel': array('q'),
+            }
+            self._columns[source] = columns
+        return columns
+
+    def _add_issue(self, issue: str, source: str, row: int, project, month) -> None:
+        self._counts[issue] += 1
+        samples = self._samples[issue]
+        entry = (-self._source_order[source], -row,
+                 {"source": source, "row": row, "project": project, "month": month})
+        if len(samples) < self.sample_limit:
+            heapq.heappush(samples, entry)
+        elif entry[:2] > samples[0][:2]:
+            heapq.heapreplace(samples, entry)
+
+    def observe(self, source: str, row: int, project, month, personnel_number, hours) -> None:
+        """Регистрирует одну запись. Вызывается из цикла группировки."""
+        self._source_order.setdefault(source, len(self._source_order))
+        self._rows_checked[source] += 1
+
+        month_code = self.month_codes.get(month)
+        if month_code is None or month_code >= self.known_months_count:
+            # Неизвестный месяц получает собственный код за пределами года
+            month_code = self.month_codes.setdefault(month, len(self.month_codes))
+            self._add_issue("unknown_month", source, row, project, month)
+
+        if hours >= self.max_hours:
+            self._add_issue("excessive_hours", source, row, project, month)
+        elif hours < 0:
+            self._add_issue("negative_hours", source, row, project, month)
+
+        if not self.keep_rows:
+            return
+        columns = self._source_columns(source)
+        columns['project'].append(self._projects.setdefault(project, len(self._projects)))
+        columns['month'].append(month_code)
+        columns['personnel'].append(self._personnel.setdefault(personnel_number, len(self._personnel)))
+
+    def iter_checking_duplicates(self, source: str, records):
+        """
+        Пропускает записи одной партиции проекта, отмечая дубли (проект, месяц, человек).
+
+        Все месяцы проекта лежат в одной партиции, поэтому дубли не пересекают
+        её границ. Записи должны нести номер строки во входном файле в поле 'row'.
+        """
+        seen = set()
+        for record in records:
+            key = (record['project'], record['month'], record['personnel_number'])
+            if key in seen:
+                self._add_issue("duplicate_personnel", source, record['row'], record['project'], record['month'])
+            else:
+                seen.add(key)
+            yield record
+
+    def check_itr_and_worker(self, itr_records, workers_records) -> None:
+        """
+        Отмечает строки ИТР, чей (месяц, человек) есть среди рабочих.
+
+        Вызывается для каждой партиции по человеку: в памяти держатся
+        только ключи рабочих одной партиции.
+        """
+        workers_keys = {(record['month'], record['personnel_number']) for record in workers_records}
+        for record in itr_records:
+            if (record['month'], record['personnel_number']) in workers_keys:
+                self._add_issue("itr_and_worker", 'itr', record['row'], record['project'], record['month'])
+
+    def _sorted_keys(self, source: str, with_project: bool) -> tuple:
+        """Составные целочисленные ключи строк источника и порядок их сортировки."""
+        columns = self._columns.get(source)
+        if columns is None:
+            return [], []
+
+        n_months = len(self.month_codes) + 1
+        n_personnel = len(self._personnel) + 1
+        projects = columns['project']
+        months = columns['month']
+        personnel = columns['personnel']
+
+        if with_project:
+            keys = [(p * n_months + m) * n_personnel + pn
+                    for p, m, pn in zip(projects, months, personnel)]
+        else:
+            keys = [m * n_personnel + pn for m, pn in zip(months, personnel)]
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        return keys, order
+
+    def _row_ref(self, source: str, row: int) -> tuple:
+        project_names = self._project_names
+        month_names = self._month_names
+        columns = self._columns[source]
+        return project_names[columns['project'][row]], month_names.get(columns['month'][row])
+
+    def finalize(self) -> dict:
+        """Выполняет сортировочные проверки и возвращает компактный отчёт."""
+        self._project_names = list(self._projects)
+        self._month_names = {code: month for month, code in self.month_codes.items()}
+
+        # Дубли: соседние одинаковые ключи (проект, месяц, табельный номер)
+        sorted_by_source = {}
+        for source in self._columns:
+            keys, order = self._sorted_keys(source, with_project=True)
+            for prev, cur in zip(order, order[1:]):
+                if keys[prev] == keys[cur]:
+                    project, month = self._row_ref(source, cur)
+                    self._add_issue("duplicate_personnel", source, cur, project, month)
+            sorted_by_source[source] = self._sorted_keys(source, with_project=False)
+
+        # ИТР и рабочий одновременно: слияние двух отсортированных списков (месяц, человек)
+        if 'itr' in sorted_by_source and 'workers' in sorted_by_source:
+            itr_keys, itr_order = sorted_by_source['itr']
+            workers_keys, workers_order = sorted_by_source['workers']
+            i = j = 0
+            while i < len(itr_order) and j < len(workers_order):
+                itr_key = itr_keys[itr_order[i]]
+                workers_key = workers_keys[workers_order[j]]
+                if itr_key < workers_key:
+                    i += 1
+                elif itr_key > workers_key:
+                    j += 1
+                else:
+                    # Ссылаемся на строку ИТР; повторы ключа у ИТР тоже попадут в отчёт
+                    row = itr_order[i]
+                    project, month = self._row_ref('itr', row)
+                    self._add_issue("itr_and_worker", 'itr', row, project, month)
+                    i += 1
+
+        rows_checked = {source: self._rows_checked[source] for source in self._source_order}
+        return {
+            "rows_checked": rows_checked,
+            "issues_total": sum(self._counts.values()),
+            "issues": {
+                issue: {
+                    "description": description,
+                    "count": self._counts[issue],
+                    "rows": [sample for _, _, sample in sorted(self._samples[issue], reverse=True)],
+                }
+                for issue, description in ISSUE_DESCRIPTIONS.items()
+                if self._counts[issue]
+            },
+        }
@@ -0,0 +1,408 @@
+"""
+Публикация изменений между пересчётами в виде компактных патчей.
+
+Каждый пересчёт перезаписывает все файлы public/data, и браузеры и зеркала
+заново скачивают их целиком, даже если исправление затронуло один проект.
+DeltaPublisher запоминает прошлое содержимое публикуемых файлов перед
+перезаписью, а после неё сравнивает старую и новую версии и пишет:
+
+- delta_manifest.json — текущая версия, хэши файлов и список доступных патчей;
+- deltas/v{N}/{файл}.patch.json — патч файла от версии N-1 к версии N.
+
+Клиент с версией M применяет по порядку патчи всех версий после M; если
+для файла указан "patch": null или версия M уже вне истории, файл
+скачивается целиком.
+
+Записи в списках сопоставляются по стабильным ключам (project,
+position_group, scale), а не по позиции, поэтому вставка проекта
+не порождает изменений во всех следующих записях. Сравнение линейное:
+списки индексируются словарями по ключу.
+
+Операции патча (path — список сегментов: ключ словаря или
+{"key": {поле: значение, ...}} для записи списка):
+    {"op": "add" | "replace", "path": [...], "value": ...}
+    {"op": "remove", "path": [...]}
+    {"op": "reorder", "path": [...], "moves": [{"key": {...}, "after": {...} | null}, ...]}
+Добавленные записи списка дописываются в конец, затем применяется reorder:
+каждая перемещаемая запись по порядку ставится сразу после записи "after"
+(null — в начало списка). Перемещаются только сдвинутые записи: остальные
+образуют наибольшую возрастающую подпоследовательность и остаются на месте,
+поэтому смена места одного проекта в сортировке даёт одно перемещение,
+а не весь список ключей.
+"""
+
+import hashlib
+import json
+import shutil
+from bisect import bisect_left
+from pathlib import Path
+
+from background_io import atomic_write_bytes, serialize_json
+
+DELTA_FORMAT_VERSION = 2
+MANIFEST_NAME = "delta_manifest.json"
+DELTAS_DIR_NAME = "deltas"
+
+# Сколько последних патчей хранить; клиенты старше должны скачать файлы целиком
+MAX_PATCH_HISTORY = 10
+
+# Поля, по которым сопоставляются записи списков
+KEY_FIELDS = ("project", "position_group", "scale")
+
+
+def _keyed_list_fields(old: list, new: list) -> tuple:
+    """Ключевые поля для сопоставления записей двух версий списка или None."""
+    items = old + new
+    if not items or not all(isinstance(item, dict) for item in items):
+        return None
+    fields = tuple(field for field in KEY_FIELDS if all(field in item for item in items))
+    if not fields:
+        return None
+    # Ключ должен однозначно определять запись в каждой версии
+    for version in (old, new):
+        if len({tuple(item[field] for field in fields) for item in version}) != len(version):
+            return None
+    return fields
+
+
+def diff_json(old, new, path: list = None) -> list:
+    """Возвращает список операций, превращающих old в new."""
+    path = path or []
+    if old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": path + [key]})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": path + [key], "value": value})
+            else:
+                ops.extend(diff_json(old[key], value, path + [key]))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        fields = _keyed_list_fields(old, new)
+        if fields is not None:
+            return _diff_keyed_list(old, new, fields, path)
+
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def _diff_keyed_list(old: list, new: list, fields: tuple, path: list) -> list:
+    def key_of(item):
+        return tuple(item[field] for field in fields)
+
+    def segment(key):
+        return {"key": dict(zip(fields, key))}
+
+    old_by_key = {key_of(item): item for item in old}
+    new_keys = set()
+    ops = []
+
+    for item in new:
+        key = key_of(item)
+        new_keys.add(key)
+        previous = old_by_key.get(key)
+        if previous is None:
+            ops.append({"op": "add", "path": path + [segment(key)], "value": item})
+        else:
+            ops.extend(diff_json(previous, item, path + [segment(key)]))
+
+    for item in old:
+        key = key_of(item)
+        if key not in new_keys:
+            ops.append({"op": "remove", "path": path + [segment(key)]})
+
+    # Порядок после применения: старые записи на месте, новые — в конце
+    applied_order = [key_of(item) for item in old if key_of(item) in new_keys]
+    applied_order += [key_of(item) for item in new if key_of(item) not in old_by_key]
+    new_order = [key_of(item) for item in new]
+    if applied_order != new_order:
+        moves = [{"key": segment(key)["key"], "after": segment(after)["key"] if after is not None else None}
+                 for key, after in _displaced_keys(applied_order, new_order)]
+        ops.append({"op": "reorder", "path": path, "moves": moves})
+    return ops
+
+
+def _displaced_keys(current: list, target: list) -> list:
+    """
+    Минимальный набор перемещений current -> target: [(ключ, ключ перед ним в target или None)].
+
+    Записи наибольшей возрастающей (по позиции в current) подпоследовательности
+    target остаются на месте, остальные перечисляются в порядке target.
+    """
+    position = {key: i for i, key in enumerate(current)}
+    positions = [position[key] for key in target]
+
+    # Наибольшая возрастающая подпоследовательность за O(n log n)
+    tails = []          # наименьшая позиция-хвост для каждой длины
+    tail_index = []     # индекс в target для этого хвоста
+    previous = [-1] * len(positions)
+    for i, value in enumerate(positions):
+        length = bisect_left(tails, value)
+        if length == len(tails):
+            tails.append(value)
+            tail_index.append(i)
+        else:
+            tails[length] = value
+            tail_index[length] = i
+        previous[i] = tail_index[length - 1] if length else -1
+
+    stable = set()
+    i = tail_index[-1] if tail_index else -1
+    while i >= 0:
+        stable.add(i)
+        i = previous[i]
+
+    return [(key, target[i - 1] if i else None) for i, key in enumerate(target) if i not in stable]
+
+
+# Заглушка на месте удалённой записи списка до финального уплотнения
+_REMOVED = object()
+
+
+class _PatchApplier:
+    """
+    Применение операций за линейное время.
+
+    Для списков с ключами один раз строится индекс {ключ: позиция};
+    удалённые записи помечаются заглушкой, а список уплотняется в конце,
+    поэтому позиции в индексе остаются верными.
+    """
+
+    def __init__(self, doc):
+        self.root = {"": doc}
+        self._indexes = {}
+        self._lists = {}
+
+    @staticmethod
+    def _key(key: dict) -> tuple:
+        return tuple(sorted(key.items()))
+
+    def _index(self, items: list, fields: tuple) -> dict:
+        cached = self._indexes.get((id(items), fields))
+        # Список мог быть заменён целиком, а его id — переиспользован
+        if cached is not None and cached[0] is items:
+            return cached[1]
+        index = {}
+        for position, item in enumerate(items):
+            if item is not _REMOVED:
+                index[self._key({field: item[field] for field in fields})] = position
+        self._indexes[(id(items), fields)] = (items, index)
+        self._lists[id(items)] = items
+        return index
+
+    def _locate(self, container, segment):
+        if isinstance(segment, dict):
+            fields = tuple(segment["key"])
+            return self._index(container, fields)[self._key(segment["key"])]
+        return segment
+
+    def _compact(self, items: list) -> None:
+        items[:] = [item for item in items if item is not _REMOVED]
+        for cache_key in [k for k in self._indexes if k[0] == id(items)]:
+            del self._indexes[cache_key]
+
+    def _move(self, items: list, moves: list) -> None:
+        """Перемещения reorder через двусвязный список ключей: каждое за O(1)."""
+        fields = tuple(moves[0]["key"])
+        keys = [self._key({field: item[field] for field in fields}) for item in items]
+        by_key = dict(zip(keys, items))
+        next_key = dict(zip(keys, keys[1:] + [None]))
+        prev_key = dict(zip(keys, [None] + keys[:-1]))
+        first = keys[0] if keys else None
+
+        for move in moves:
+            key = self._key(move["key"])
+            after = self._key(move["after"]) if move["after"] is not None else None
+            # Вынимаем запись из текущего места
+            before, following = prev_key[key], next_key[key]
+            if before is None:
+                first = following
+            else:
+                next_key[before] = following
+            if following is not None:
+                prev_key[following] = before
+            # Ставим сразу после after
+            following = first if after is None else next_key[after]
+            prev_key[key], next_key[key] = after, following
+            if after is None:
+                first = key
+            else:
+                next_key[after] = key
+            if following is not None:
+                prev_key[following] = key
+
+        ordered = []
+        key = first
+        while key is not None:
+            ordered.append(by_key[key])
+            key = next_key[key]
+        items[:] = ordered
+
+    def apply(self, op: dict) -> None:
+        path = [""] + op["path"]
+        parent = self.root
+        for segment in path[:-1]:
+            parent = parent[self._locate(parent, segment)]
+        last = path[-1]
+
+        if op["op"] == "reorder":
+            target = parent[self._locate(parent, last)]
+            self._compact(target)
+            if op["moves"]:
+                self._move(target, op["moves"])
+        elif isinstance(last, dict):
+            fields = tuple(last["key"])
+            index = self._index(parent, fields)
+            key = self._key(last["key"])
+            if op["op"] == "add":
+                index[key] = len(parent)
+                parent.append(op["value"])
+            elif op["op"] == "remove":
+                parent[index.pop(key)] = _REMOVED
+            else:
+                parent[index[key]] = op["value"]
+        elif op["op"] == "remove":
+            del parent[last]
+        else:
+            parent[last] = op["value"]
+
+    def result(self):
+        for items in self._lists.values():
+            if any(item is _REMOVED for item in items):
+                self._compact(items)
+        return self.root[""]
+
+
+def apply_patch(doc, ops: list):
+    """Применяет операции patch к документу (на месте) и возвращает его."""
+    applier = _PatchApplier(doc)
+    for op in ops:
+        applier.apply(op)
+    return applier.result()
+
+
+def _sha256(filepath: Path) -> str:
+    return hashlib.sha256(filepath.read_bytes()).hexdigest()
+
+
+def _load(filepath: Path):
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _dump_compact(filepath: Path, data) -> None:
+    # Клиент не должен увидеть недописанный манифест или патч
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(filepath, serialize_json(data, compact=True))
+
+
+class DeltaPublisher:
+    """
+    Снимок публикуемых файлов до пересчёта и выпуск патчей после него.
+
+    snapshot() вызывается до перезаписи файлов, publish() — после.
+    """
+
+    def __init__(self, data_dir: Path, filenames: list):
+        self.data_dir = Path(data_dir)
+        self.filenames = list(filenames)
+        self.manifest_path = self.data_dir / MANIFEST_NAME
+        self.deltas_dir = self.data_dir / DELTAS_DIR_NAME
+        self._previous = {}
+        self._previous_hashes = {}
+
+    def snapshot(self) -> None:
+        for filename in self.filenames:
+            path = self.data_dir / filename
+            if path.exists():
+                self._previous[filename] = _load(path)
+                self._previous_hashes[filename] = _sha256(path)
+
+    def _load_manifest(self) -> dict:
+        if not self.manifest_path.exists():
+            return None
+        manifest = _load(self.manifest_path)
+        if manifest.get("format_version") != DELTA_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def publish(self) -> dict:
+        """Сравнивает файлы с прошлой версией, пишет патчи и манифест."""
+        manifest = self._load_manifest()
+        version = manifest["version"] + 1 if manifest else 1
+        patches = manifest["patches"] if manifest else []
+
+        files = {}
+        changed = []
+        for filename in self.filenames:
+            path = self.data_dir / filename
+            if not path.exists():
+                continue
+            files[filename] = {"sha256": _sha256(path), "size": path.stat().st_size}
+
+            # Без манифеста клиентам не с чем сопоставить прошлое содержимое
+            if manifest is None:
+                continue
+            # Сравниваем с тем, что клиенты получили по манифесту, а не со снимком:
+            # после сбоя между записью файлов и манифестом снимок уже новый
+            published_hash = manifest["files"].get(filename, {}).get("sha256")
+            if published_hash == files[filename]["sha256"]:
+                continue
+            previous_hash = self._previous_hashes.get(filename)
+            if previous_hash is None or previous_hash != published_hash:
+                # Файл новый, изменён в обход пересчёта или уже перезаписан прерванным
+                # запуском: снимок не совпадает с опубликованным, клиентам нужна полная версия
+                changed.append({"file": filename, "patch": None})
+                continue
+
+            new = _load(path)
+            ops = diff_json(self._previous[filename], new)
+            if not ops:
+                continue
+            # Патч должен воспроизводить новый файл — иначе публиковать его нельзя
+            if apply_patch(json.loads(json.dumps(self._previous[filename])), ops) != new:
+                raise RuntimeError(f"Патч {filename} не воспроизводит новую версию")
+
+            patch_path = self.deltas_dir / f"v{version}" / f"{filename}.patch.json"
+            _dump_compact(patch_path, {
+                "format_version": DELTA_FORMAT_VERSION,
+                "file": filename,
+                "from_version": version - 1,
+                "to_version": version,
+                "base_sha256": self._previous_hashes[filename],
+                "result_sha256": files[filename]["sha256"],
+                "ops": ops,
+            })
+            changed.append({
+                "file": filename,
+                "patch": patch_path.relative_to(self.data_dir).as_posix(),
+                "ops": len(ops),
+                "size": patch_path.stat().st_size,
+            })
+
+        if manifest is not None:
+            patches = patches + [{"from_version": version - 1, "to_version": version, "files": changed}]
+            patches = patches[-MAX_PATCH_HISTORY:]
+        self._prune(oldest_version=patches[0]["to_version"] if patches else version + 1)
+
+        new_manifest = {
+            "format_version": DELTA_FORMAT_VERSION,
+            "version": version,
+            "files": files,
+            "patches": patches,
+        }
+        _dump_compact(self.manifest_path, new_manifest)
+        return new_manifest
+
+    def _prune(self, oldest_version: int) -> None:
+        if not self.deltas_dir.exists():
+            return
+        for version_dir in self.deltas_dir.iterdir():
+            name = version_dir.name
+            if name.startswith("v") and name[1:].isdigit() and int(name[1:]) < oldest_version:
+                shutil.rmtree(version_dir)
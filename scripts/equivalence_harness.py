@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""
+Проверка эквивалентности и скорости альтернативных путей расчёта.
+
+Опубликованные projects_analysis.json, position_norms_by_scale.json и
+monthly_calculation_details.json — эталон: любой более быстрый путь
+расчёта обязан воспроизводить их точно, включая округление js_round.
+Скрипт запускает эталонный calculate_monthly_stats и альтернативные пути
+на одних и тех же входных данных (реальных или синтетических), каждый
+в отдельном временном дереве и отдельном процессе, и:
+
+- сравнивает выходные файлы поле за полем (числа с плавающей точкой —
+  с допуском --float-tolerance, целые, строки и типы — точно);
+- сверяет эталонный прогон с файлами в --golden (по умолчанию public/data;
+  новые поля, которых нет в эталонных файлах, расхождением не считаются);
+- записывает время и пиковую память каждого пути, ускорение и отношение
+  памяти к эталонному прогону.
+
+Каждое дерево начинается с прошлой публикации (файлы public/data
+репозитория и манифест патчей к ним), поэтому сравнивается и выпущенный
+манифест. Путь checkpoints запускается дважды: первый прогон прерывается
+сразу после сохранения контрольной точки scale_aggregates, второй
+продолжает с неё.
+
+При любом расхождении скрипт печатает пути к отличающимся полям и
+завершается с кодом 1.
+
+Реальные табели (data/; workers_data_2025.json в репозиторий не входит)
+берутся из --itr/--workers; без них проверка идёт на синтетических данных.
+
+Использование:
+    python scripts/equivalence_harness.py --synthetic-projects 500 --seed 7 --repeat 3
+    python scripts/equivalence_harness.py --itr itr.json --workers workers.json
+    python scripts/equivalence_harness.py --path out_of_core --path overlap_io
+    python scripts/equivalence_harness.py --alternative "fast:scripts/recalculate_monthly_stats.py --overlap-io"
+"""
+
+import argparse
+import json
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from delta_publish import MANIFEST_NAME, DeltaPublisher
+from export_public_dataset import ANONYMIZATION_KEY_ENV
+from recalculate_monthly_stats import (
+    CALCULATOR_CONFIG_FILE, DATA_DIR, INPUT_DIR, ITR_FILE, MONTHS_ORDER, MOVEMENT_OUTPUT, PUBLISHED_OUTPUTS,
+    QUALITY_REPORT_OUTPUT, ROLLUP_OUTPUT, SHARED_STAFF_OUTPUT, STAFFING_TABLE_OUTPUT, WORKERS_FILE,
+    load_json,
+)
+from rollup_cube import parse_project_name
+
+SCRIPTS_DIR = Path(__file__).parent
+
+REFERENCE_COMMANDS = [["scripts/recalculate_monthly_stats.py"]]
+
+# Площадок в проверке частичных агрегатов: при меньшем числе слияние
+# деревом не выполнялось бы
+MIN_SITES = 3
+
+# Ключ анонимизации для частичных агрегатов (общий для всех «площадок» прогона)
+HARNESS_ANONYMIZATION_KEY = "equivalence-harness"
+
+# Этап, после контрольной точки которого прерывается первый прогон пути checkpoints
+INTERRUPTED_STAGE = "scale_aggregates"
+
+# Обёртка пересчёта для пути checkpoints, кладётся в корень дерева (не в scripts/,
+# чтобы не менять отпечаток контрольных точек):
+#   interrupted_run.py interrupt <этап> <аргументы> — падает сразу после сохранения точки этапа;
+#   interrupted_run.py resume <этап> <аргументы> — завершается с ошибкой, если точка этапа
+#   не была восстановлена, то есть продолжение фактически не проверено.
+INTERRUPTED_RUN_SCRIPT = '''import runpy
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent / "scripts" / "recalculate_monthly_stats.py"
+sys.path.insert(0, str(SCRIPT.parent))
+from checkpoints import CheckpointStore
+
+mode, stage = sys.argv[1], sys.argv[2]
+sys.argv = [str(SCRIPT)] + sys.argv[3:]
+
+
+class Interrupted(Exception):
+    pass
+
+
+save, load = CheckpointStore.save, CheckpointStore.load
+restored = []
+
+
+def save_and_interrupt(self, name, value):
+    save(self, name, value)
+    if name == stage:
+        raise Interrupted(name)
+
+
+def load_and_record(self, name):
+    found, value = load(self, name)
+    if found:
+        restored.append(name)
+    return found, value
+
+
+if mode == "interrupt":
+    CheckpointStore.save = save_and_interrupt
+    try:
+        runpy.run_path(str(SCRIPT), run_name="__main__")
+    except Interrupted:
+        print(f"Прогон прерван после контрольной точки {stage}")
+        sys.exit(0)
+    print(f"Контрольная точка {stage} не сохранялась — прерывание не сработало")
+    sys.exit(1)
+
+CheckpointStore.load = load_and_record
+runpy.run_path(str(SCRIPT), run_name="__main__")
+if stage not in restored:
+    print(f"Контрольная точка {stage} не восстановлена — продолжение не проверено")
+    sys.exit(1)
+'''
+
+
+def split_sites(input_dir: Path, sites_dir: Path) -> list:
+    """
+    Делит табели дерева на площадки по стране в имени проекта ((RU), (KZ), ...).
+
+    Площадки разных стран не пересекаются по проектам, и слияние ячеек
+    одного проекта-месяца на них не проверяется. Поэтому записи самой
+    большой площадки дополнительно делятся через одну на две площадки
+    (RU-1, RU-2) — и так, пока площадок меньше MIN_SITES.
+    Возвращает [(площадка, табель ИТР, табель рабочих)] по возрастанию числа записей.
+    """
+    sites = defaultdict(lambda: {"itr": [], "workers": []})
+    for source, filename in (("itr", ITR_FILE.name), ("workers", WORKERS_FILE.name)):
+        for record in load_json(input_dir / filename):
+            sites[parse_project_name(record['project']).country][source].append(record)
+
+    def size(site: str) -> int:
+        return len(sites[site]["itr"]) + len(sites[site]["workers"])
+
+    split = False
+    while not split or len(sites) < MIN_SITES:
+        largest = max(sites, key=size)
+        if size(largest) < 2:
+            break
+        records = sites.pop(largest)
+        for part in (1, 2):
+            sites[f"{largest}-{part}"] = {source: source_records[part - 1::2]
+                                          for source, source_records in records.items()}
+        split = True
+
+    sites_dir.mkdir(parents=True, exist_ok=True)
+    result = []
+    for site in sorted(sites, key=lambda site: (size(site), site)):
+        files = []
+        for source in ("itr", "workers"):
+            path = sites_dir / f"{source}_{site}.json"
+            path.write_text(json.dumps(sites[site][source], ensure_ascii=False), encoding="utf-8")
+            files.append(path)
+        result.append((site, *files))
+    return result
+
+
+def partial_aggregate_commands(tree: Path, data: Path) -> list:
+    """
+    Частичный агрегат на каждой площадке и слияние деревом: попарно от
+    меньших площадок к большим, последнее слияние — с --finalize.
+    Для (RU), (KZ), (BY) это (BY+KZ)+(RU-1+RU-2).
+    """
+    commands = []
+    level = []
+    for site, itr_file, workers_file in split_sites(tree / INPUT_DIR.name, tree / "sites"):
+        partial = tree / "sites" / f"{site}.json.gz"
+        commands.append(["scripts/partial_aggregates.py", "compute", "--site", site, "--itr", str(itr_file),
+                         "--workers", str(workers_file), "-o", str(partial)])
+        level.append(partial)
+
+    while len(level) > 2:
+        merged_level = []
+        for i in range(0, len(level) - 1, 2):
+            merged = tree / "sites" / f"merge_{len(commands)}.json.gz"
+            commands.append(["scripts/partial_aggregates.py", "merge", str(level[i]), str(level[i + 1]),
+                             "-o", str(merged)])
+            merged_level.append(merged)
+        if len(level) % 2:
+            merged_level.append(level[-1])
+        level = merged_level
+    commands.append(["scripts/partial_aggregates.py", "merge"] + [str(path) for path in level] + ["--finalize"])
+    return commands
+
+
+def interrupted_checkpoint_commands(tree: Path, data: Path) -> list:
+    """Прерванный прогон с контрольными точками и продолжение с них."""
+    (tree / "interrupted_run.py").write_text(INTERRUPTED_RUN_SCRIPT, encoding="utf-8")
+    return [["interrupted_run.py", mode, INTERRUPTED_STAGE, "--checkpoint-dir", str(tree / "checkpoints")]
+            for mode in ("interrupt", "resume")]
+
+
+# Альтернативные пути: команды относительно корня временного дерева
+# ({tree} — корень дерева, {data} — его public/data) или функция (tree, data),
+# которая готовит дерево и возвращает команды
+ALTERNATIVE_PATHS = {
+    "out_of_core": [["scripts/recalculate_monthly_stats.py", "--memory-budget-mb", "1"]],
+    "overlap_io": [["scripts/recalculate_monthly_stats.py", "--overlap-io"]],
+    "checkpoints": interrupted_checkpoint_commands,
+    "partial_aggregates": partial_aggregate_commands,
+}
+
+# Дополнительные переменные окружения путей
+PATH_ENVIRONMENT = {
+    "partial_aggregates": {ANONYMIZATION_KEY_ENV: HARNESS_ANONYMIZATION_KEY},
+}
+
+# Файлы, которые каждый путь обязан воспроизвести
+REQUIRED_OUTPUTS = [path.name for path in PUBLISHED_OUTPUTS] + [STAFFING_TABLE_OUTPUT.name, MANIFEST_NAME]
+# Вспомогательные файлы сравниваются, если путь их создаёт
+AUXILIARY_OUTPUTS = [QUALITY_REPORT_OUTPUT.name, SHARED_STAFF_OUTPUT.name, MOVEMENT_OUTPUT.name,
+                     ROLLUP_OUTPUT.name]
+
+# Сколько расхождений печатать по каждому файлу
+MAX_REPORTED_DIVERGENCES = 20
+
+
+def compare_json(expected, actual, float_tolerance: float = 0.0, allow_extra_keys: bool = False,
+                 path: str = "$") -> list:
+    """Список расхождений вида "путь: описание"; пустой список — данные совпадают."""
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return [] if type(expected) is type(actual) and expected == actual else \
+            [f"{path}: ожидалось {expected!r}, получено {actual!r}"]
+
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        if type(expected) is not type(actual):
+            # 50 и 50.0 по-разному записываются в JSON
+            return [f"{path}: тип {type(expected).__name__} != {type(actual).__name__} "
+                    f"({expected!r} / {actual!r})"]
+        if isinstance(expected, int):
+            return [] if expected == actual else [f"{path}: ожидалось {expected}, получено {actual}"]
+        if abs(expected - actual) <= float_tolerance:
+            return []
+        return [f"{path}: ожидалось {expected!r}, получено {actual!r} (разница {abs(expected - actual):.3g})"]
+
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        divergences = []
+        for key, value in expected.items():
+            if key not in actual:
+                divergences.append(f"{path}.{key}: поле отсутствует")
+            else:
+                divergences.extend(compare_json(value, actual[key], float_tolerance, allow_extra_keys,
+                                                f"{path}.{key}"))
+        if not allow_extra_keys:
+            divergences.extend(f"{path}.{key}: лишнее поле" for key in actual if key not in expected)
+        return divergences
+
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return [f"{path}: длина {len(expected)} != {len(actual)}"]
+        divergences = []
+        for i, (left, right) in enumerate(zip(expected, actual)):
+            divergences.extend(compare_json(left, right, float_tolerance, allow_extra_keys, f"{path}[{i}]"))
+        return divergences
+
+    if type(expected) is not type(actual) or expected != actual:
+        return [f"{path}: ожидалось {expected!r}, получено {actual!r}"]
+    return []
+
+
+def compare_manifest(expected: dict, actual: dict) -> list:
+    """
+    Манифест патчей сравнивается точно с одним послаблением: вместо патча
+    допустим "patch": null (клиенты скачают файл целиком). Так публикует
+    продолжение прерванного прогона, который уже перезаписал файл.
+    """
+    full_files = {(entry["to_version"], item["file"])
+                  for entry in actual.get("patches", []) for item in entry["files"] if item["patch"] is None}
+    for entry in expected.get("patches", []):
+        entry["files"] = [{"file": item["file"], "patch": None}
+                          if (entry["to_version"], item["file"]) in full_files else item
+                          for item in entry["files"]]
+    return compare_json(expected, actual, path=MANIFEST_NAME)
+
+
+def compare_output(expected_path: Path, actual_path: Path, float_tolerance: float,
+                   allow_extra_keys: bool = False) -> list:
+    if not actual_path.exists():
+        return [f"{actual_path.name}: файл не создан"]
+    if actual_path.suffix != ".json":
+        # Бинарные файлы (таблица численности) должны совпадать побайтно
+        same = expected_path.read_bytes() == actual_path.read_bytes()
+        return [] if same else [f"{actual_path.name}: содержимое отличается"]
+    if actual_path.name == MANIFEST_NAME:
+        return compare_manifest(load_json(expected_path), load_json(actual_path))
+    return compare_json(load_json(expected_path), load_json(actual_path), float_tolerance, allow_extra_keys,
+                        actual_path.name)
+
+
+def generate_synthetic_inputs(n_projects: int, seed: int) -> tuple:
+    """
+    Синтетические табели ИТР и рабочих в формате исходных файлов.
+
+    Численность проектов меняется по месяцам, часть ИТР работает на двух
+    проектах, встречаются часы >= 300 — чтобы задействовать все ветви расчёта.
+    """
+    rng = random.Random(seed)
+    position_groups = list(load_json(CALCULATOR_CONFIG_FILE)['position_group_percentages'])
+    countries = ["RU", "RU", "RU", "KZ", "BY"]
+
+    itr_records = []
+    workers_records = []
+    next_worker = 100000
+    next_itr = 1
+    previous_itr_pool = []
+    for p in range(n_projects):
+        project = (f"({rng.choice(countries)}) Заказчик{rng.randrange(n_projects // 3 + 1)}"
+                   f"-Объект{p}-Площадка{rng.randrange(n_projects // 2 + 1)}")
+        start = rng.randrange(len(MONTHS_ORDER) - 2)
+        duration = rng.randint(1, len(MONTHS_ORDER) - start)
+        base_workers = int(rng.lognormvariate(4.2, 1.0)) + 3
+        trend = rng.uniform(-0.1, 0.15)
+
+        worker_pool = list(range(next_worker, next_worker + base_workers * 2))
+        next_worker += len(worker_pool)
+        itr_pool_size = max(2, base_workers // rng.randint(4, 15))
+        itr_pool = [(next_itr + i, rng.choice(position_groups)) for i in range(itr_pool_size)]
+        next_itr += itr_pool_size
+        # Совместители: несколько ИТР предыдущего проекта
+        itr_pool += rng.sample(previous_itr_pool, min(len(previous_itr_pool), rng.randint(0, 3)))
+        previous_itr_pool = itr_pool
+
+        for offset in range(duration):
+            month = MONTHS_ORDER[start + offset]
+            workers = max(1, min(len(worker_pool), int(base_workers * (1 + trend * offset) * rng.uniform(0.85, 1.15))))
+            for personnel_number in rng.sample(worker_pool, workers):
+                workers_records.append({"personnel_number": personnel_number, "project": project,
+                                        "month": month, "hours": rng.randint(40, 260)})
+            present = [person for person in itr_pool if rng.random() < 0.9] or itr_pool[:1]
+            for personnel_number, position_group in present:
+                itr_records.append({"personnel_number": personnel_number, "project": project,
+                                    "month": month, "position_group": position_group,
+                                    "hours": rng.choice([rng.randint(80, 299), 300, rng.randint(150, 250)])})
+    return itr_records, workers_records
+
+
+def publish_previous_release(data: Path) -> None:
+    """Прошлая публикация в дереве: файлы public/data репозитория и манифест к ним."""
+    filenames = [path.name for path in PUBLISHED_OUTPUTS]
+    for filename in filenames:
+        if (DATA_DIR / filename).exists():
+            shutil.copy2(DATA_DIR / filename, data / filename)
+    DeltaPublisher(data, filenames).publish()
+
+
+def prepare_tree(root: Path, itr_file: Path, workers_file: Path) -> Path:
+    """
+    Временное дерево: копия скриптов, входные табели, конфигурация
+    калькулятора и прошлая публикация.
+    """
+    scripts = root / "scripts"
+    data = root / "public" / "data"
+    inputs = root / INPUT_DIR.name
+    for directory in (scripts, data, inputs):
+        directory.mkdir(parents=True)
+    for script in SCRIPTS_DIR.glob("*.py"):
+        shutil.copy2(script, scripts / script.name)
+    shutil.copy2(itr_file, inputs / ITR_FILE.name)
+    shutil.copy2(workers_file, inputs / WORKERS_FILE.name)
+    shutil.copy2(CALCULATOR_CONFIG_FILE, data / CALCULATOR_CONFIG_FILE.name)
+    publish_previous_release(data)
+    return data
+
+
+def _run_command(command: list, cwd: Path, log, env: dict = None) -> tuple:
+    """Запускает команду; (код возврата, секунды, пиковая память процесса в КБ или None)."""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT,
+                               env={**os.environ, **env} if env else None)
+    if hasattr(os, "wait4"):
+        # wait4 даёт потребление ресурсов именно этого процесса
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        max_rss = usage.ru_maxrss
+    else:
+        process.wait()
+        max_rss = None
+    return process.returncode, time.perf_counter() - started, max_rss
+
+
+def run_path(name: str, commands, workdir: Path, itr_file: Path, workers_file: Path,
+             repeat: int) -> dict:
+    """
+    Прогоняет путь repeat раз, каждый раз в новом дереве.
+
+    commands — список команд или функция (tree, data), возвращающая его;
+    подготовка дерева в замер времени не входит. Время — минимальное
+    из прогонов, память — максимальная; выходные файлы берутся из
+    последнего прогона.
+    """
+    timings = []
+    peak_rss = None
+    for attempt in range(repeat):
+        tree = workdir / f"{name}-{attempt}"
+        data = prepare_tree(tree, itr_file, workers_file)
+        path_commands = commands(tree, data) if callable(commands) else commands
+        seconds = 0.0
+        with open(tree / "run.log", "w", encoding="utf-8") as log:
+            for command in path_commands:
+                args = [arg.format(tree=tree, data=data) for arg in command]
+                code, elapsed, max_rss = _run_command([sys.executable] + args, tree, log,
+                                                      PATH_ENVIRONMENT.get(name))
+                seconds += elapsed
+                if max_rss is not None:
+                    peak_rss = max(peak_rss or 0, max_rss)
+                if code != 0:
+                    log.flush()
+                    tail = (tree / "run.log").read_text(encoding="utf-8").splitlines()[-20:]
+                    raise RuntimeError(f"Путь {name}: команда {' '.join(args)} завершилась с кодом {code}\n"
+                                       + "\n".join(tail))
+        timings.append(seconds)
+        if attempt + 1 < repeat:
+            shutil.rmtree(tree)
+    return {"name": name, "data_dir": data, "seconds": min(timings), "max_rss_kb": peak_rss}
+
+
+def parse_alternative(text: str) -> tuple:
+    """'имя:скрипт аргументы...' -> (имя, [[скрипт, аргументы...]])."""
+    name, sep, command = text.partition(":")
+    if not sep or not name or not command.strip():
+        raise argparse.ArgumentTypeError("ожидается 'имя:скрипт аргументы'")
+    return name, [shlex.split(command)]
+
+
+def print_divergences(title: str, divergences: list) -> None:
+    print(f"\n!!! РАСХОЖДЕНИЕ: {title} ({len(divergences)})")
+    for divergence in divergences[:MAX_REPORTED_DIVERGENCES]:
+        print(f"    {divergence}")
+    if len(divergences) > MAX_REPORTED_DIVERGENCES:
+        print(f"    ... и ещё {len(divergences) - MAX_REPORTED_DIVERGENCES}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Эквивалентность и скорость альтернативных путей расчёта ИТР")
+    parser.add_argument("--itr", type=Path, default=ITR_FILE, help="Табель ИТР (JSON)")
+    parser.add_argument("--workers", type=Path, default=WORKERS_FILE,
+                        help="Табель рабочих (JSON; в репозиторий не входит — без него используйте "
+                             "--synthetic-projects)")
+    parser.add_argument("--synthetic-projects", type=int, default=None,
+                        help="Сгенерировать синтетические табели на N проектов вместо --itr/--workers")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора синтетических данных")
+    parser.add_argument("--golden", type=Path, default=DATA_DIR,
+                        help="Каталог эталонных файлов (по умолчанию public/data)")
+    parser.add_argument("--no-golden", action="store_true", help="Не сверять эталонный прогон с --golden")
+    parser.add_argument("--path", dest="paths", action="append", choices=list(ALTERNATIVE_PATHS),
+                        help="Альтернативные пути (по умолчанию все)")
+    parser.add_argument("--alternative", action="append", type=parse_alternative, default=[],
+                        help="Дополнительный путь 'имя:скрипт аргументы' относительно корня дерева")
+    parser.add_argument("--float-tolerance", type=float, default=0.0,
+                        help="Допуск для чисел с плавающей точкой (по умолчанию точное совпадение)")
+    parser.add_argument("--repeat", type=int, default=1, help="Прогонов каждого пути (берётся лучшее время)")
+    parser.add_argument("--keep", action="store_true", help="Не удалять временные деревья")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="Сохранить отчёт (JSON)")
+    args = parser.parse_args()
+
+    paths = {name: ALTERNATIVE_PATHS[name] for name in (args.paths or ALTERNATIVE_PATHS)}
+    paths.update(dict(args.alternative))
+
+    if args.synthetic_projects is None:
+        missing = [str(path) for path in (args.itr, args.workers) if not path.exists()]
+        if missing:
+            print(f"Нет входных табелей: {', '.join(missing)}")
+            print("  Укажите --itr/--workers или проверьте на синтетических данных: --synthetic-projects N")
+            return 1
+
+    workdir = Path(tempfile.mkdtemp(prefix="itr-equivalence-"))
+    failures = 0
+    try:
+        itr_file, workers_file = args.itr, args.workers
+        synthetic = args.synthetic_projects is not None
+        if synthetic:
+            itr_records, workers_records = generate_synthetic_inputs(args.synthetic_projects, args.seed)
+            itr_file, workers_file = workdir / ITR_FILE.name, workdir / WORKERS_FILE.name
+            itr_file.write_text(json.dumps(itr_records, ensure_ascii=False), encoding="utf-8")
+            workers_file.write_text(json.dumps(workers_records, ensure_ascii=False), encoding="utf-8")
+            print(f"Синтетические данные: {args.synthetic_projects} проектов, ITR записей {len(itr_records)}, "
+                  f"Workers записей {len(workers_records)}")
+
+        print("Эталонный прогон (calculate_monthly_stats)...")
+        reference = run_path("reference", REFERENCE_COMMANDS, workdir, itr_file, workers_file, args.repeat)
+        report = {"inputs": {"synthetic_projects": args.synthetic_projects, "seed": args.seed if synthetic else None,
+                             "itr": str(itr_file), "workers": str(workers_file)},
+                  "float_tolerance": args.float_tolerance,
+                  "reference": {"seconds": round(reference["seconds"], 3), "max_rss_kb": reference["max_rss_kb"]},
+                  "golden": None, "paths": []}
+
+        # Эталонные файлы относятся к реальным табелям, синтетику с ними не сверяем
+        if not args.no_golden and not synthetic:
+            golden_divergences = []
+            compared = []
+            for name in [path.name for path in PUBLISHED_OUTPUTS]:
+                if (args.golden / name).exists():
+                    compared.append(name)
+                    golden_divergences.extend(compare_output(args.golden / name, reference["data_dir"] / name,
+                                                             args.float_tolerance, allow_extra_keys=True))
+            report["golden"] = {"files": compared, "divergences": golden_divergences}
+            if golden_divergences:
+                failures += 1
+                print_divergences(f"эталонный прогон и {args.golden}", golden_divergences)
+            else:
+                print(f"  Совпадает с эталоном: {', '.join(compared)}")
+
+        for name, commands in paths.items():
+            print(f"Путь {name}...")
+            result = run_path(name, commands, workdir, itr_file, workers_file, args.repeat)
+            divergences = []
+            compared = []
+            for output in REQUIRED_OUTPUTS + AUXILIARY_OUTPUTS:
+                produced = (result["data_dir"] / output).exists()
+                if output in AUXILIARY_OUTPUTS and not produced:
+                    continue
+                compared.append(output)
+                divergences.extend(compare_output(reference["data_dir"] / output, result["data_dir"] / output,
+                                                  args.float_tolerance))
+
+            speedup = reference["seconds"] / result["seconds"] if result["seconds"] > 0 else None
+            memory_ratio = (result["max_rss_kb"] / reference["max_rss_kb"]
+                            if result["max_rss_kb"] and reference["max_rss_kb"] else None)
+            report["paths"].append({
+                "name": name,
+                "seconds": round(result["seconds"], 3),
+                "max_rss_kb": result["max_rss_kb"],
+                "speedup": round(speedup, 3) if speedup is not None else None,
+                "memory_ratio": round(memory_ratio, 3) if memory_ratio is not None else None,
+                "files": compared,
+                "divergences": divergences,
+            })
+            if divergences:
+                failures += 1
+                print_divergences(f"путь {name}", divergences)
+
+        print(f"\n{'Путь':<22} | {'время, с':>9} | {'память, МБ':>10} | {'ускорение':>9} | {'память/эталон':>13} | итог")
+        print("-" * 85)
+        reference_mb = reference["max_rss_kb"] / 1024 if reference["max_rss_kb"] else 0
+        print(f"{'reference':<22} | {reference['seconds']:>9.2f} | {reference_mb:>10.1f} | {'1.00':>9} | "
+              f"{'1.00':>13} | {'эталон' if report['golden'] is None or not report['golden']['divergences'] else 'РАСХОЖДЕНИЕ'}")
+        for entry in report["paths"]:
+            rss_mb = entry["max_rss_kb"] / 1024 if entry["max_rss_kb"] else 0
+            speedup = f"{entry['speedup']:.2f}" if entry["speedup"] is not None else "-"
+            memory_ratio = f"{entry['memory_ratio']:.2f}" if entry["memory_ratio"] is not None else "-"
+            status = "РАСХОЖДЕНИЕ" if entry["divergences"] else "совпадает"
+            print(f"{entry['name']:<22} | {entry['seconds']:>9.2f} | {rss_mb:>10.1f} | {speedup:>9} | "
+                  f"{memory_ratio:>13} | {status}")
+
+        if args.output is not None:
+            args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+            print(f"\n  Отчёт сохранён в {args.output}")
+    except RuntimeError as e:
+        print(f"\n!!! ОШИБКА ПРОГОНА: {e}")
+        return 1
+    finally:
+        if args.keep:
+            print(f"  Временные деревья: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"\n!!! Найдены расхождения ({failures}) — результаты расчёта изменились")
+        return 1
+    print("\nВсе пути воспроизводят эталон")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Экспорт компактной анонимизированной версии табеля ИТР для публикации.
+
+Исходный itr_data_2025.json содержит ФИО и три почти одинаковые строки
+должности в каждой записи. Для помесячной аналитики нужны только
+проект, месяц, группа должности, часы и идентичность человека, поэтому:
+- ФИО и position_full/position_short отбрасываются;
+- табельный номер заменяется ключевым хэшем (HMAC-SHA256, ключ из
+  переменной окружения ITR_ANONYMIZATION_KEY);
+- проекты, месяцы, группы должностей и хэши кодируются словарями,
+  а записи хранятся по колонкам целыми числами.
+
+Запуск: ITR_ANONYMIZATION_KEY=... python scripts/export_public_dataset.py
+"""
+
+import hashlib
+import hmac
+import os
+import sys
+
+COMPACT_FORMAT_VERSION = 1
+ANONYMIZATION_KEY_ENV = "ITR_ANONYMIZATION_KEY"
+
+# 12 hex-символов = 48 бит: коллизия маловероятна при любом реальном штате,
+# но build_compact_dataset всё равно проверяет её явно
+PERSON_HASH_LENGTH = 12
+
+COLUMNS = ["person", "project", "month", "position_group", "hours"]
+
+
+def get_anonymization_key() -> bytes:
+    """Возвращает ключ анонимизации из окружения или None, если он не задан."""
+    key = os.environ.get(ANONYMIZATION_KEY_ENV)
+    return key.encode('utf-8') if key else None
+
+
+def hash_personnel_number(personnel_number, key: bytes) -> str:
+    """Ключевой хэш табельного номера; без ключа номер не восстановить перебором."""
+    digest = hmac.new(key, str(personnel_number).encode('utf-8'), hashlib.sha256).hexdigest()
+    return digest[:PERSON_HASH_LENGTH]
+
+
+def build_compact_dataset(itr_data: list, key: bytes, months_order: list) -> dict:
+    """
+    Строит компактный колоночный набор данных из записей ИТР.
+
+    Записи сортируются по (проект, месяц, группа должности), чтобы соседние
+    значения в колонках повторялись и файл хорошо сжимался при передаче.
+    """
+    month_index = {month: idx for idx, month in enumerate(months_order)}
+    months = list(months_order)
+    for record in itr_data:
+        if record['month'] not in month_index:
+            month_index[record['month']] = len(months)
+            months.append(record['month'])
+
+    projects = sorted({record['project'] for record in itr_data})
+    position_groups = sorted({record['position_group'] for record in itr_data})
+    project_index = {project: idx for idx, project in enumerate(projects)}
+    group_index = {group: idx for idx, group in enumerate(position_groups)}
+
+    person_index = {}
+    persons = []
+    hashes = {}
+    hash_owners = {}
+
+    rows = []
+    for record in itr_data:
+        personnel_number = record['personnel_number']
+        person_hash = hashes.get(personnel_number)
+        if person_hash is None:
+            person_hash = hash_personnel_number(personnel_number, key)
+            hashes[personnel_number] = person_hash
+            owner = hash_owners.setdefault(person_hash, personnel_number)
+            if owner != personnel_number:
+                # Два человека с одним хэшем слились бы в одного в колонке person
+                raise ValueError(f"Коллизия хэшей табельных номеров: {person_hash}")
+        idx = person_index.get(person_hash)
+        if idx is None:
+            idx = len(persons)
+            person_index[person_hash] = idx
+            persons.append(person_hash)
+
+        rows.append((
+            idx,
+            project_index[record['project']],
+            month_index[record['month']],
+            group_index[record['position_group']],
+            record.get('hours', 0),
+        ))
+
+    rows.sort(key=lambda r: (r[1], r[2], r[3], r[0]))
+
+    return {
+        "format_version": COMPACT_FORMAT_VERSION,
+        "records_count": len(rows),
+        "dictionaries": {
+            "person": persons,
+            "project": projects,
+            "month": months,
+            "position_group": position_groups,
+        },
+        "columns": {name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)},
+    }
+
+
+def expand_compact_dataset(compact: dict) -> list:
+    """
+    Разворачивает компактный набор обратно в список записей.
+
+    personnel_number заменён хэшем, остальные поля совпадают с исходными,
+    поэтому записи можно напрямую передать в group_records().
+    """
+    if compact.get("format_version") != COMPACT_FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия формата: {compact.get('format_version')}")
+
+    dictionaries = compact["dictionaries"]
+    columns = compact["columns"]
+    persons = dictionaries["person"]
+    projects = dictionaries["project"]
+    months = dictionaries["month"]
+    position_groups = dictionaries["position_group"]
+
+    return [
+        {
+            "personnel_number": persons[person],
+            "project": projects[project],
+            "month": months[month],
+            "position_group": position_groups[group],
+            "hours": hours,
+        }
+        for person, project, month, group, hours in zip(
+            columns["person"], columns["project"], columns["month"],
+            columns["position_group"], columns["hours"])
+    ]
+
+
+def summarize_itr_groups(itr_data: list) -> dict:
+    """Уникальные ИТР и часы по (проект, месяц, группа) — всё, что нужно помесячной аналитике."""
+    people = {}
+    hours = {}
+    for record in itr_data:
+        key = (record['project'], record['month'], record['position_group'])
+        people.setdefault(key, set()).add(record['personnel_number'])
+        hours[key] = hours.get(key, 0) + record.get('hours', 0)
+    return {key: (len(people[key]), hours[key]) for key in people}
+
+
+def verify_compact_dataset(compact: dict, itr_data: list) -> bool:
+    """Совпадают ли уникальные ИТР и часы компактного набора с исходными записями."""
+    return summarize_itr_groups(expand_compact_dataset(compact)) == summarize_itr_groups(itr_data)
+
+
+def main() -> int:
+    from recalculate_monthly_stats import (
+        ITR_FILE, COMPACT_ITR_OUTPUT, MONTHS_ORDER, load_json, save_compact_json,
+    )
+
+    key = get_anonymization_key()
+    if key is None:
+        print(f"Не задан ключ анонимизации: установите {ANONYMIZATION_KEY_ENV}")
+        return 1
+
+    itr_data = load_json(ITR_FILE)
+    try:
+        compact = build_compact_dataset(itr_data, key, MONTHS_ORDER)
+    except ValueError as e:
+        print(f"{e} — экспорт отменён")
+        return 1
+
+    if not verify_compact_dataset(compact, itr_data):
+        print("Компактный набор расходится с исходными данными — экспорт отменён")
+        return 1
+
+    save_compact_json(COMPACT_ITR_OUTPUT, compact)
+    original_size = ITR_FILE.stat().st_size
+    compact_size = COMPACT_ITR_OUTPUT.stat().st_size
+    print(f"Сохранено {compact['records_count']} записей в {COMPACT_ITR_OUTPUT.name}")
+    print(f"  Размер: {original_size / 1024:.0f} КБ -> {compact_size / 1024:.0f} КБ "
+          f"({original_size / compact_size:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Прогноз потребности в ИТР на следующий квартал по тренду численности рабочих.
+
+По monthly_dynamics.json для каждого действующего проекта строится тренд
+численности рабочих, продлевается на horizon месяцев вперёд, и для каждого
+прогнозного месяца определяются масштаб проекта (get_project_scale) и
+численность ИТР по recommended_K из position_norms_by_scale.json — так же,
+как в калькуляторе: ceil(рабочие / K).
+
+Модели считаются сразу для всех проектов: за один проход по записям
+накапливаются столбцы сумм (n, Σt, Σy, Σt², Σty) по проектам, после чего
+коэффициенты МНК получаются поэлементными операциями над столбцами, без
+отдельной модели на каждый проект. Численность ИТР по рабочим берётся
+из предрассчитанной таблицы (staffing_table), то есть одним обращением
+по индексу.
+
+Модели:
+- linear — линейный тренд по последним window месяцам проекта;
+- last — последнее известное значение;
+- auto — linear, если у проекта не меньше min_months месяцев в окне, иначе last.
+
+Сезонные модели не строятся: данные охватывают меньше одного года, и
+поправки на месяц года для ноября–января оценить не по чему.
+
+Использование:
+    python scripts/forecast_itr_demand.py
+    python scripts/forecast_itr_demand.py --horizon 6 --model linear --window 4
+"""
+
+import argparse
+import sys
+from array import array
+from collections import defaultdict
+from pathlib import Path
+
+from recalculate_monthly_stats import (
+    CALCULATOR_CONFIG_FILE, DATA_DIR, MONTHS_ORDER, POSITION_NORMS_OUTPUT, POSITION_OUTPUT,
+    get_project_scale, js_round, load_json, save_json,
+)
+from staffing_table import build_staffing_tables
+
+MONTHLY_DYNAMICS_FILE = DATA_DIR / "monthly_dynamics.json"
+FORECAST_OUTPUT = DATA_DIR / "itr_demand_forecast.json"
+
+FORECAST_MODELS = ("auto", "linear", "last")
+DEFAULT_HORIZON = 3
+DEFAULT_WINDOW = 6
+DEFAULT_MIN_MONTHS = 3
+
+
+class TrendColumns:
+    """Суммы для МНК по всем проектам сразу: столбец j — проект projects[j]."""
+
+    def __init__(self, projects: list):
+        size = len(projects)
+        self.projects = projects
+        self.n = array('l', [0]) * size
+        self.sum_t = array('d', [0.0]) * size
+        self.sum_y = array('d', [0.0]) * size
+        self.sum_tt = array('d', [0.0]) * size
+        self.sum_ty = array('d', [0.0]) * size
+        self.last_t = array('l', [-1]) * size
+        self.last_y = array('d', [0.0]) * size
+
+    def fit(self, model: str, min_months: int) -> tuple:
+        """
+        Коэффициенты y = intercept + slope * t для всех проектов (поэлементно по столбцам).
+
+        Третий столбец — 1, если для проекта построен линейный тренд, 0 — последнее значение.
+        """
+        intercepts = array('d')
+        slopes = array('d')
+        linear = array('b')
+        for n, st, sy, stt, sty, last_y in zip(self.n, self.sum_t, self.sum_y, self.sum_tt,
+                                               self.sum_ty, self.last_y):
+            denominator = n * stt - st * st
+            if model == "last" or n < (2 if model == "linear" else min_months) or denominator == 0:
+                intercepts.append(last_y)
+                slopes.append(0.0)
+                linear.append(0)
+                continue
+            slope = (n * sty - st * sy) / denominator
+            intercepts.append((sy - slope * st) / n)
+            slopes.append(slope)
+            linear.append(1)
+        return intercepts, slopes, linear
+
+
+def collect_trend_columns(records: list, window: int) -> tuple:
+    """
+    Два прохода по записям: последний месяц каждого проекта, затем суммы по окну.
+
+    Возвращает (TrendColumns, последние записи проектов, последний месяц данных).
+    """
+    month_index = {month: i for i, month in enumerate(MONTHS_ORDER)}
+    last_month = {}
+    last_record = {}
+    for record in records:
+        t = month_index.get(record['month'])
+        if t is None:
+            continue
+        if t > last_month.get(record['project'], -1):
+            last_month[record['project']] = t
+            last_record[record['project']] = record
+
+    projects = sorted(last_month)
+    column = {project: j for j, project in enumerate(projects)}
+    columns = TrendColumns(projects)
+    for record in records:
+        t = month_index.get(record['month'])
+        if t is None:
+            continue
+        j = column[record['project']]
+        if t <= last_month[record['project']] - window:
+            continue
+        y = record['workers_unique_count']
+        columns.n[j] += 1
+        columns.sum_t[j] += t
+        columns.sum_y[j] += y
+        columns.sum_tt[j] += t * t
+        columns.sum_ty[j] += t * y
+    for project, j in column.items():
+        columns.last_t[j] = last_month[project]
+        columns.last_y[j] = last_record[project]['workers_unique_count']
+
+    return columns, last_record, max(last_month.values(), default=-1)
+
+
+def project_positions() -> dict:
+    """Группы должностей, которые есть на каждом проекте, по position_distribution."""
+    positions = defaultdict(set)
+    for record in load_json(POSITION_OUTPUT):
+        positions[record['project']].add(record['position_group'])
+    return positions
+
+
+def forecast(records: list, position_norms: list, calculator_config: dict, positions: dict,
+             horizon: int = DEFAULT_HORIZON, model: str = "auto", window: int = DEFAULT_WINDOW,
+             min_months: int = DEFAULT_MIN_MONTHS, active_within: int = 1) -> dict:
+    columns, last_record, data_last_month = collect_trend_columns(records, window)
+    intercepts, slopes, linear = columns.fit(model, min_months)
+
+    # Прогнозная численность рабочих: столбец на каждый месяц горизонта
+    future_t = [data_last_month + step for step in range(1, horizon + 1)]
+    projected = [
+        array('l', (max(0, js_round(a + b * t)) for a, b in zip(intercepts, slopes)))
+        for t in future_t
+    ]
+
+    max_workers = max([max(column, default=0) for column in projected] + [1])
+    staffing = build_staffing_tables(position_norms, calculator_config, max_workers,
+                                     get_project_scale)["scale_k"]
+
+    def itr_for(position_group: str, workers: int):
+        """ИТР группы по таблице; None — для масштаба нет нормы K."""
+        if workers == 0:
+            return 0
+        column = staffing.get(position_group)
+        count = column[workers - 1] if column is not None else 0
+        return count if count else None
+
+    months = [{"month": MONTHS_ORDER[t % 12], "year_offset": t // 12} for t in future_t]
+    projects = []
+    inactive = []
+    transitions_total = 0
+    for j, project in enumerate(columns.projects):
+        if columns.last_t[j] <= data_last_month - active_within:
+            # Проект без данных в последних месяцах считается завершённым
+            inactive.append(project)
+            continue
+
+        last = last_record[project]
+        last_workers = last['workers_unique_count']
+        scale = get_project_scale(last_workers)
+        groups = sorted(positions.get(project, ()))
+
+        projection = []
+        transitions = []
+        for month, column in zip(months, projected):
+            workers = column[j]
+            next_scale = get_project_scale(workers)
+            if next_scale != scale:
+                transitions.append({**month, "from": scale, "to": next_scale})
+            scale = next_scale
+            by_position = {group: itr_for(group, workers) for group in groups}
+            projection.append({
+                **month,
+                "workers": workers,
+                "scale": next_scale,
+                "itr_by_position": by_position,
+                "itr_total": sum(count for count in by_position.values() if count is not None),
+            })
+        transitions_total += len(transitions)
+
+        projects.append({
+            "project": project,
+            "last_month": MONTHS_ORDER[columns.last_t[j]],
+            "last_workers": last_workers,
+            "last_itr": last['itr_unique_count'],
+            "last_scale": get_project_scale(last_workers),
+            "model": "linear" if linear[j] else "last",
+            "months_in_window": columns.n[j],
+            "workers_trend_per_month": round(slopes[j], 2),
+            "projection": projection,
+            "scale_transitions": transitions,
+        })
+
+    return {
+        "parameters": {
+            "model": model,
+            "horizon": horizon,
+            "window": window,
+            "min_months": min_months,
+            "data_last_month": MONTHS_ORDER[data_last_month] if data_last_month >= 0 else None,
+        },
+        "months": months,
+        "summary": {
+            "projects_forecast": len(projects),
+            "projects_inactive": len(inactive),
+            "scale_transitions": transitions_total,
+            "itr_total_by_month": [sum(p["projection"][i]["itr_total"] for p in projects)
+                                   for i in range(horizon)],
+            "workers_total_by_month": [sum(p["projection"][i]["workers"] for p in projects)
+                                       for i in range(horizon)],
+        },
+        "projects": projects,
+        "inactive_projects": inactive,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Прогноз потребности в ИТР по тренду численности рабочих")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="Месяцев вперёд")
+    parser.add_argument("--model", choices=FORECAST_MODELS, default="auto")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="Сколько последних месяцев проекта учитывать в тренде")
+    parser.add_argument("--min-months", type=int, default=DEFAULT_MIN_MONTHS,
+                        help="Минимум месяцев для линейного тренда в режиме auto")
+    parser.add_argument("--active-within", type=int, default=1,
+                        help="Проект действующий, если есть данные за последние N месяцев")
+    parser.add_argument("-o", "--output", type=Path, default=FORECAST_OUTPUT)
+    args = parser.parse_args()
+    if args.horizon < 1 or args.window < 1:
+        parser.error("--horizon и --window должны быть положительными")
+
+    records = load_json(MONTHLY_DYNAMICS_FILE)['monthly_dynamics']
+    result = forecast(records, load_json(POSITION_NORMS_OUTPUT), load_json(CALCULATOR_CONFIG_FILE),
+                      project_positions(), horizon=args.horizon, model=args.model, window=args.window,
+                      min_months=args.min_months, active_within=args.active_within)
+
+    summary = result["summary"]
+    print(f"Проектов в прогнозе: {summary['projects_forecast']}, завершённых: {summary['projects_inactive']}")
+    for month, workers, itr in zip(result["months"], summary["workers_total_by_month"],
+                                   summary["itr_total_by_month"]):
+        print(f"  {month['month']}: рабочих {workers}, ИТР {itr}")
+    print(f"  Смен масштаба: {summary['scale_transitions']}")
+
+    save_json(args.output, result)
+    print(f"  Прогноз сохранён в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Расчёт вне памяти: разбиение табелей на партиции по проекту со сбросом на диск.
+
+Когда табель не помещается в память, вложенные словари группировки
+строить сразу для всех проектов нельзя. Записи потоково читаются из
+JSON-массива, и каждая сбрасывается в файл своей партиции. Номер партиции
+определяется хэшем проекта, поэтому все месяцы проекта оказываются в одной
+партиции. Затем партиции по одной группируются и считаются обычным кодом.
+Проекты независимы, так что объединение результатов партиций совпадает
+с расчётом в памяти.
+
+Для проверки «ИТР и рабочий в одном месяце» записи дополнительно
+раскладываются по партициям (месяц, табельный номер): совпадающие ключи
+обоих табелей оказываются в одной партиции.
+"""
+
+import json
+import math
+import re
+import tempfile
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # resource есть только в Unix
+    resource = None
+
+# Во сколько раз сгруппированные данные в памяти больше исходного JSON (оценка сверху)
+MEMORY_PER_INPUT_BYTE = 2.0
+
+# Верхняя граница числа партиций (файлов во временном каталоге на источник)
+MAX_PARTITIONS = 256
+
+# Дескрипторы, которые остаются процессу помимо файлов партиций
+RESERVED_FILE_DESCRIPTORS = 64
+# Лимит открытых файлов, если узнать его нельзя
+DEFAULT_OPEN_FILES_LIMIT = 512
+
+# Пробелы и запятые между элементами JSON-массива
+_SEPARATORS = re.compile(r'[\s,]*')
+
+# Поля, которые нужны группировке и проверке дублей; остальное (ФИО, полные
+# должности) на диск не пишется. row — номер строки во входном файле
+SPILL_FIELDS = {
+    'itr': ('project', 'month', 'position_group', 'personnel_number', 'hours', 'row'),
+    'workers': ('project', 'month', 'personnel_number', 'hours', 'row'),
+}
+
+# Поля партиций по табельному номеру: совпадения ИТР и рабочих, совместители
+# и движение ИТР между проектами — вся история человека в одной партиции
+PERSON_FIELDS = {
+    'itr': ('project', 'month', 'position_group', 'personnel_number', 'hours', 'row'),
+    'workers': ('month', 'personnel_number'),
+}
+
+
+def iter_json_array(filepath: Path, chunk_size: int = 1 << 20):
+    """
+    Потоково читает JSON-файл вида [{...}, {...}] и возвращает объекты по одному.
+
+    В памяти держится только текущий кусок файла, а не весь массив.
+    """
+    decoder = json.JSONDecoder()
+    with open(filepath, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        pos = _SEPARATORS.match(buffer).end()
+        if buffer[pos:pos + 1] != '[':
+            raise ValueError(f"{Path(filepath).name}: ожидается JSON-массив")
+        pos += 1
+        eof = False
+
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if buffer.startswith(']', pos):
+                return
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Объект обрезан границей куска: дочитываем и повторяем
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield obj
+
+
+def estimate_partitions(input_files: list, memory_budget_mb: float) -> int:
+    """Число партиций, при котором одна партиция укладывается в бюджет памяти."""
+    total_bytes = sum(Path(path).stat().st_size for path in input_files)
+    budget_bytes = memory_budget_mb * 1024 * 1024
+    partitions = math.ceil(total_bytes * MEMORY_PER_INPUT_BYTE / budget_bytes)
+    if partitions > MAX_PARTITIONS:
+        print(f"  Внимание: для бюджета {memory_budget_mb} МБ нужно {partitions} партиций, "
+              f"используется {MAX_PARTITIONS} — бюджет памяти может быть превышен")
+        return MAX_PARTITIONS
+    return max(1, partitions)
+
+
+def max_open_writers() -> int:
+    """Сколько файлов партиций можно держать открытыми при текущем лимите дескрипторов (ulimit -n)."""
+    limit = DEFAULT_OPEN_FILES_LIMIT
+    if resource is not None:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            limit = soft
+    return max(2, limit - RESERVED_FILE_DESCRIPTORS)
+
+
+def partition_of(key: str, n_partitions: int) -> int:
+    """Стабильный (не зависящий от PYTHONHASHSEED) номер партиции ключа."""
+    return zlib.crc32(key.encode('utf-8')) % n_partitions
+
+
+def project_key(record: dict) -> str:
+    return record['project']
+
+
+def personnel_key(record: dict) -> str:
+    # json.dumps различает табельные номера 5 и "5", как и группировка
+    return json.dumps(record['personnel_number'], ensure_ascii=False)
+
+
+class SpillPartitioner:
+    """
+    Раскладывает записи по файлам партиций во временном каталоге.
+
+    Используется как контекстный менеджер: при выходе файлы удаляются.
+    Порядок записей внутри партиции совпадает с порядком во входном файле.
+    По умолчанию партиция определяется проектом записи (key=project_key).
+
+    Открытыми держатся не больше max_open файлов: при превышении давно
+    не использованный файл закрывается и при следующей записи дописывается.
+    """
+
+    def __init__(self, n_partitions: int, spill_dir: Path = None, fields: dict = None, key=project_key,
+                 max_open: int = None):
+        self.n_partitions = n_partitions
+        self.spill_dir = spill_dir
+        self.fields = fields if fields is not None else SPILL_FIELDS
+        self.key = key
+        self.max_open = max(1, max_open if max_open is not None else max_open_writers())
+        self._tmpdir = None
+        self._writers = OrderedDict()
+        self._created = set()
+        self.records_spilled = {source: 0 for source in self.fields}
+
+    def __enter__(self):
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="itr_spill_", dir=self.spill_dir)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._close_writers()
+        self._tmpdir.cleanup()
+
+    def _path(self, source: str, partition: int) -> Path:
+        return Path(self._tmpdir.name) / f"{source}_{partition:04d}.jsonl"
+
+    def _close_writers(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    def add(self, source: str, record: dict) -> None:
+        """Сбрасывает запись в файл её партиции."""
+        partition = partition_of(self.key(record), self.n_partitions)
+        writer_key = (source, partition)
+        writer = self._writers.get(writer_key)
+        if writer is None:
+            if len(self._writers) >= self.max_open:
+                self._writers.popitem(last=False)[1].close()
+            writer = open(self._path(source, partition), 'a' if writer_key in self._created else 'w',
+                          encoding='utf-8')
+            self._created.add(writer_key)
+            self._writers[writer_key] = writer
+        else:
+            self._writers.move_to_end(writer_key)
+
+        fields = self.fields[source]
+        writer.write(json.dumps([record.get(field, 0) for field in fields], ensure_ascii=False))
+        writer.write('\n')
+        self.records_spilled[source] += 1
+
+    def _read(self, source: str, partition: int):
+        path = self._path(source, partition)
+        if not path.exists():
+            return
+        fields = self.fields[source]
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield dict(zip(fields, json.loads(line)))
+
+    def partitions(self):
+        """Возвращает по одной партиции пары итераторов (записи ИТР, записи рабочих)."""
+        self._close_writers()
+        for partition in range(self.n_partitions):
+            yield self._read('itr', partition), self._read('workers', partition)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Частичные агрегаты для распределённого пересчёта по регионам.
+
+Табели региональных офисов ((RU), (BY), ...) нельзя собрать в одном месте,
+поэтому каждая площадка считает у себя частичный агрегат — результат
+group_records(), сериализованный в JSON:
+
+    {
+      "format_version": 2,
+      "sites": ["RU"],
+      "itr": {project: {month: {position_group: {"personnel": [...], "hours": N}}}},
+      "workers": {project: {month: {"personnel": [...], "hours": N}}}
+    }
+
+Для уникальных людей хранятся точные множества, а не приближённые скетчи:
+только так итоговые файлы совпадают с расчётом по объединённым данным.
+Табельные номера покидают площадку только ключевыми хэшами
+(hash_personnel_number из export_public_dataset). Ключ
+ITR_ANONYMIZATION_KEY общий для всех площадок, поэтому один человек
+на разных площадках даёт один хэш и уникальные счётчики после слияния
+остаются точными. Слияние — объединение множеств и сумма часов, поэтому
+оно ассоциативно и коммутативно: агрегаты можно сливать деревом в любом
+порядке и любыми группами.
+
+Использование:
+    # на площадке (ключ анонимизации — общий для всех площадок)
+    ITR_ANONYMIZATION_KEY=... python scripts/partial_aggregates.py compute --site RU --itr itr.json --workers workers.json -o ru.json.gz
+    # промежуточное слияние (например, на узле региона)
+    python scripts/partial_aggregates.py merge ru.json.gz by.json.gz -o cis.json.gz
+    # финальное слияние с записью projects_analysis, position_distribution и норм
+    python scripts/partial_aggregates.py merge cis.json.gz kz.json.gz --finalize
+"""
+
+import argparse
+import gzip
+import json
+import sys
+from collections import defaultdict
+from functools import reduce
+from pathlib import Path
+
+from recalculate_monthly_stats import (
+    MONTHS_ORDER, compute_project_stats, group_records, load_json, print_quality_report, save_results,
+    save_rollup_cube,
+)
+from data_quality import TimesheetValidator
+from export_public_dataset import ANONYMIZATION_KEY_ENV, get_anonymization_key, hash_personnel_number
+from personnel_keys import personnel_sort_key
+
+PARTIAL_FORMAT_VERSION = 2
+
+
+def _sorted_ids(personnel) -> list:
+    """Идентификаторы людей в каноническом порядке."""
+    return sorted(personnel, key=personnel_sort_key)
+
+
+class _PersonnelHasher:
+    """Ключевые хэши табельных номеров с проверкой коллизий внутри площадки."""
+
+    def __init__(self, key: bytes):
+        self.key = key
+        self._hashes = {}
+        self._owners = {}
+
+    def __call__(self, personnel_set) -> list:
+        hashed = []
+        for personnel_number in personnel_set:
+            person_hash = self._hashes.get(personnel_number)
+            if person_hash is None:
+                person_hash = hash_personnel_number(personnel_number, self.key)
+                if self._owners.setdefault(person_hash, personnel_number) != personnel_number:
+                    # Два человека с одним хэшем слились бы в одного при подсчёте уникальных
+                    raise ValueError(f"Коллизия хэшей табельных номеров: {person_hash}")
+                self._hashes[personnel_number] = person_hash
+            hashed.append(person_hash)
+        return _sorted_ids(hashed)
+
+
+def grouped_to_partial(grouped: tuple, sites: list, key: bytes) -> dict:
+    """Сериализует результат group_records() в частичный агрегат с хэшами вместо табельных номеров."""
+    (itr_by_project_month, itr_hours_by_project_month,
+     workers_by_project_month, workers_hours_by_project_month) = grouped
+    hashed_ids = _PersonnelHasher(key)
+
+    itr = {}
+    for project, months in itr_by_project_month.items():
+        itr[project] = {
+            month: {
+                position_group: {
+                    "personnel": hashed_ids(personnel_set),
+                    "hours": itr_hours_by_project_month[project][month][position_group],
+                }
+                for position_group, personnel_set in groups.items()
+            }
+            for month, groups in months.items()
+        }
+
+    workers = {}
+    for project, months in workers_by_project_month.items():
+        workers[project] = {
+            month: {
+                "personnel": hashed_ids(personnel_set),
+                "hours": workers_hours_by_project_month[project][month],
+            }
+            for month, personnel_set in months.items()
+        }
+
+    return {
+        "format_version": PARTIAL_FORMAT_VERSION,
+        "sites": sorted(sites),
+        "itr": itr,
+        "workers": workers,
+    }
+
+
+def partial_to_grouped(partial: dict) -> tuple:
+    """Восстанавливает структуры group_records() из частичного агрегата."""
+    itr_by_project_month = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
+    itr_hours_by_project_month = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    workers_by_project_month = defaultdict(lambda: defaultdict(set))
+    workers_hours_by_project_month = defaultdict(lambda: defaultdict(int))
+
+    for project, months in partial["itr"].items():
+        for month, groups in months.items():
+            for position_group, cell in groups.items():
+                itr_by_project_month[project][month][position_group] = set(cell["personnel"])
+                itr_hours_by_project_month[project][month][position_group] = cell["hours"]
+
+    for project, months in partial["workers"].items():
+        for month, cell in months.items():
+            workers_by_project_month[project][month] = set(cell["personnel"])
+            workers_hours_by_project_month[project][month] = cell["hours"]
+
+    return (itr_by_project_month, itr_hours_by_project_month,
+            workers_by_project_month, workers_hours_by_project_month)
+
+
+def _merge_cell(left: dict, right: dict) -> dict:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return {
+        "personnel": _sorted_ids(set(left["personnel"]) | set(right["personnel"])),
+        "hours": left["hours"] + right["hours"],
+    }
+
+
+def _merge_nested(left: dict, right: dict, depth: int) -> dict:
+    """Сливает вложенные словари, на глубине depth — ячейки агрегата."""
+    if depth == 0:
+        return _merge_cell(left, right)
+    merged = {}
+    for key in sorted(set(left) | set(right)):
+        merged[key] = _merge_nested(left.get(key, {} if depth > 1 else None),
+                                    right.get(key, {} if depth > 1 else None), depth - 1)
+    return merged
+
+
+def merge_partials(left: dict, right: dict) -> dict:
+    """Сливает два частичных агрегата. Операция ассоциативна и коммутативна."""
+    for partial in (left, right):
+        if partial.get("format_version") != PARTIAL_FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата: {partial.get('format_version')}")
+
+    overlap = set(left["sites"]) & set(right["sites"])
+    if overlap:
+        # Повторное слияние той же площадки удвоило бы часы
+        raise ValueError(f"Площадки уже учтены в обоих агрегатах: {sorted(overlap)}")
+
+    return {
+        "format_version": PARTIAL_FORMAT_VERSION,
+        "sites": sorted(set(left["sites"]) | set(right["sites"])),
+        "itr": _merge_nested(left["itr"], right["itr"], depth=3),
+        "workers": _merge_nested(left["workers"], right["workers"], depth=2),
+    }
+
+
+def load_partial(filepath: Path) -> dict:
+    """Загружает частичный агрегат (.json или .json.gz)."""
+    opener = gzip.open if filepath.suffix == '.gz' else open
+    with opener(filepath, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_partial(filepath: Path, partial: dict) -> None:
+    """Сохраняет частичный агрегат (.json или .json.gz)."""
+    opener = gzip.open if filepath.suffix == '.gz' else open
+    with opener(filepath, 'wt', encoding='utf-8') as f:
+        json.dump(partial, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def compute_command(args) -> int:
+    key = get_anonymization_key()
+    if key is None:
+        print(f"Не задан ключ анонимизации: установите {ANONYMIZATION_KEY_ENV} (общий для всех площадок)")
+        return 1
+
+    itr_data = load_json(args.itr)
+    workers_data = load_json(args.workers)
+    print(f"Площадка {args.site}: ITR записей {len(itr_data)}, Workers записей {len(workers_data)}")
+
+    validator = TimesheetValidator(MONTHS_ORDER)
+    grouped = group_records(itr_data, workers_data, validator)
+    print_quality_report(validator.finalize())
+
+    save_partial(args.output, grouped_to_partial(grouped, [args.site], key))
+    print(f"  Частичный агрегат сохранён в {args.output}")
+    return 0
+
+
+def merge_command(args) -> int:
+    merged = reduce(merge_partials, (load_partial(path) for path in args.partials))
+    print(f"Слито агрегатов: {len(args.partials)}, площадки: {', '.join(merged['sites'])}")
+
+    if args.output is not None:
+        save_partial(args.output, merged)
+        print(f"  Частичный агрегат сохранён в {args.output}")
+
+    if args.finalize:
+        grouped = partial_to_grouped(merged)
+        project_months = []
+        results = compute_project_stats(grouped, project_months=project_months)
+        save_rollup_cube(project_months)
+        save_results(*results)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Частичные агрегаты для распределённого пересчёта ИТР")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compute = subparsers.add_parser("compute", help="Посчитать частичный агрегат по табелям площадки")
+    compute.add_argument("--site", required=True, help="Идентификатор площадки, например RU")
+    compute.add_argument("--itr", type=Path, required=True, help="Табель ИТР площадки (JSON)")
+    compute.add_argument("--workers", type=Path, required=True, help="Табель рабочих площадки (JSON)")
+    compute.add_argument("-o", "--output", type=Path, required=True, help="Файл агрегата (.json или .json.gz)")
+    compute.set_defaults(handler=compute_command)
+
+    merge = subparsers.add_parser("merge", help="Слить частичные агрегаты")
+    merge.add_argument("partials", type=Path, nargs="+", help="Файлы частичных агрегатов")
+    merge.add_argument("-o", "--output", type=Path, default=None, help="Сохранить слитый агрегат")
+    merge.add_argument("--finalize", action="store_true",
+                       help="Записать итоговые файлы в public/data")
+    merge.set_defaults(handler=merge_command)
+
+    args = parser.parse_args()
+    if args.command == "merge" and args.output is None and not args.finalize:
+        parser.error("укажите --output и/или --finalize")
+    try:
+        return args.handler(args)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
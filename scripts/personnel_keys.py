@@ -0,0 +1,11 @@
+"""
+Ключ сортировки табельных номеров.
+
+Табельные номера в табелях бывают и числами, и строками, а Python
+не сравнивает их между собой. Числа идут перед строками, внутри
+каждого типа — обычный порядок.
+"""
+
+
+def personnel_sort_key(personnel_number) -> tuple:
+    return (isinstance(personnel_number, str), personnel_number)
@@ -0,0 +1,268 @@
+"""
+Движение ИТР между проектами: стаж на проекте, переходы и текучесть.
+
+Записи табеля один раз сортируются по (табельный номер, месяц), и история
+каждого человека становится непрерывным участком отсортированного списка.
+Один проход по соседним месяцам каждого человека даёт:
+
+- отрезки работы — подряд идущие месяцы на проекте (и в группе должностей
+  на проекте); длина отрезка — стаж в месяцах;
+- переходы — в следующем месяце человек ушёл с одного проекта и появился
+  на другом;
+- приходы и уходы по месяцам; текучесть месяца — ушедшие / численность
+  предыдущего месяца.
+
+Что было до первого и после последнего месяца данных, неизвестно: приходы
+в первом месяце не считаются, а отрезки, продолжающиеся в последнем месяце,
+учитываются как незавершённые (ongoing_spans) — их стаж занижен.
+"""
+
+import statistics
+from collections import defaultdict
+from itertools import groupby
+
+from personnel_keys import personnel_sort_key
+
+# Сколько самых частых направлений переходов выводить
+TOP_TRANSFER_FLOWS = 50
+
+
+def _person_key(entry: tuple) -> tuple:
+    return personnel_sort_key(entry[0])
+
+
+class _LevelMovement:
+    """Отрезки работы, приходы и уходы для одного уровня ключей (проект или проект+должность)."""
+
+    def __init__(self, first_month: int, last_month: int):
+        self.first_month = first_month
+        self.last_month = last_month
+        self.headcount = defaultdict(lambda: defaultdict(int))  # {ключ: {месяц: человек}}
+        self.joined = defaultdict(lambda: defaultdict(int))
+        self.left = defaultdict(lambda: defaultdict(int))
+        self.tenures = defaultdict(list)  # {ключ: [длины отрезков]}
+        self.ongoing = defaultdict(int)
+        self.people = defaultdict(int)
+
+    def add_person(self, months: list) -> None:
+        """months — [(индекс месяца, множество ключей)] одного человека по возрастанию месяца."""
+        open_spans = {}
+        seen = set()
+        prev_month, prev_keys = None, set()
+        for month, keys in months:
+            consecutive = prev_month is not None and month == prev_month + 1
+            for key in prev_keys:
+                if not consecutive or key not in keys:
+                    self._close(key, open_spans.pop(key), prev_month)
+            for key in keys:
+                self.headcount[key][month] += 1
+                if not consecutive or key not in prev_keys:
+                    open_spans[key] = month
+                    if month > self.first_month:
+                        self.joined[key][month] += 1
+                if key not in seen:
+                    seen.add(key)
+                    self.people[key] += 1
+            prev_month, prev_keys = month, keys
+        for key in prev_keys:
+            self._close(key, open_spans.pop(key), prev_month)
+
+    def _close(self, key, start: int, end: int) -> None:
+        self.tenures[key].append(end - start + 1)
+        if end < self.last_month:
+            self.left[key][end + 1] += 1
+        else:
+            self.ongoing[key] += 1
+
+    def report(self, key, months_order: list) -> dict:
+        headcount, joined, left = self.headcount[key], self.joined[key], self.left[key]
+        monthly = []
+        left_total = 0
+        base_total = 0
+        for month in range(self.first_month, self.last_month + 1):
+            previous = headcount.get(month - 1, 0) if month > self.first_month else 0
+            if not headcount.get(month) and not left.get(month):
+                continue
+            monthly.append({
+                "month": months_order[month],
+                "headcount": headcount.get(month, 0),
+                "joined": joined.get(month, 0),
+                "left": left.get(month, 0),
+                "turnover_rate": round(left.get(month, 0) / previous, 3) if previous else None,
+            })
+            if previous:
+                left_total += left.get(month, 0)
+                base_total += previous
+
+        tenures = self.tenures[key]
+        return {
+            "people": self.people[key],
+            "spans": len(tenures),
+            "ongoing_spans": self.ongoing[key],
+            "avg_tenure_months": round(float(statistics.mean(tenures)), 1),
+            "median_tenure_months": float(statistics.median(tenures)),
+            "avg_monthly_turnover": round(left_total / base_total, 3) if base_total else None,
+            "monthly": monthly,
+        }
+
+
+class MovementAnalysis:
+    """
+    Отчёт о движении ИТР, собираемый по частям.
+
+    add() принимает кортежи (табельный номер, месяц, проект, группа должностей)
+    и может вызываться много раз, но вся история каждого человека должна прийти
+    одним вызовом — например, по партиции табеля, разложенного по табельному номеру.
+    months — все месяцы табеля: от первого и последнего зависят приходы и
+    незавершённые отрезки, поэтому они нужны до первой порции.
+    """
+
+    def __init__(self, months_order: list, months):
+        self.months_order = months_order
+        self.month_index = {month: i for i, month in enumerate(months_order)}
+        indices = [self.month_index[month] for month in months if month in self.month_index]
+        self.first_month = min(indices, default=None)
+        self.last_month = max(indices, default=None)
+
+        self.projects = _LevelMovement(self.first_month, self.last_month)
+        self.positions = _LevelMovement(self.first_month, self.last_month)
+        self.transfers_in = defaultdict(int)
+        self.transfers_out = defaultdict(int)
+        self.transfers_by_month = defaultdict(int)
+        self.flows = defaultdict(int)
+        self.people = 0
+
+    def add(self, entries) -> None:
+        """Добавляет людей, чья история целиком содержится в entries."""
+        month_index = self.month_index
+        rows = [(personnel_number, month_index[month], project, position_group)
+                for personnel_number, month, project, position_group in entries
+                if month in month_index]
+        rows.sort(key=lambda row: (_person_key(row), row[1]))
+
+        for _, person_rows in groupby(rows, key=_person_key):
+            self.people += 1
+            project_months = []
+            position_months = []
+            for month, month_rows in groupby(person_rows, key=lambda row: row[1]):
+                month_rows = list(month_rows)
+                project_months.append((month, {row[2] for row in month_rows}))
+                position_months.append((month, {(row[2], row[3]) for row in month_rows}))
+
+            # Переход: в соседнем месяце ушёл с одних проектов и пришёл на другие
+            for (prev_month, prev_projects), (month, cur_projects) in zip(project_months, project_months[1:]):
+                if month != prev_month + 1:
+                    continue
+                left_projects = prev_projects - cur_projects
+                joined_projects = cur_projects - prev_projects
+                if not left_projects or not joined_projects:
+                    continue
+                self.transfers_by_month[month] += 1
+                for source in left_projects:
+                    self.transfers_out[source] += 1
+                    for target in joined_projects:
+                        self.flows[(source, target)] += 1
+                for target in joined_projects:
+                    self.transfers_in[target] += 1
+
+            self.projects.add_person(project_months)
+            self.positions.add_person(position_months)
+
+    def report(self) -> dict:
+        """
+        Итоговый отчёт. Порядок людей в порциях на него не влияет: списки
+        упорядочиваются, а средние стажа считаются точно по целым числам.
+        """
+        months_order = self.months_order
+        if not self.people:
+            return {"months": [], "summary": {"people": 0, "spans": 0, "transfers": 0},
+                    "projects": [], "transfer_flows": []}
+
+        projects, positions = self.projects, self.positions
+        positions_by_project = defaultdict(list)
+        for project, position_group in positions.headcount:
+            positions_by_project[project].append(position_group)
+
+        project_reports = []
+        for project in sorted(projects.headcount):
+            report = {"project": project, **projects.report(project, months_order)}
+            report["transfers_in"] = self.transfers_in.get(project, 0)
+            report["transfers_out"] = self.transfers_out.get(project, 0)
+            report["positions"] = [
+                {"position_group": position_group, **positions.report((project, position_group), months_order)}
+                for position_group in sorted(positions_by_project[project])
+            ]
+            project_reports.append(report)
+
+        all_tenures = [tenure for tenures in projects.tenures.values() for tenure in tenures]
+        transfer_flows = sorted(self.flows.items(), key=lambda item: (-item[1], item[0]))[:TOP_TRANSFER_FLOWS]
+
+        return {
+            "months": months_order[self.first_month:self.last_month + 1],
+            "summary": {
+                "people": self.people,
+                "spans": len(all_tenures),
+                "avg_tenure_months": round(float(statistics.mean(all_tenures)), 1),
+                "median_tenure_months": float(statistics.median(all_tenures)),
+                "transfers": sum(self.transfers_by_month.values()),
+                "transfers_by_month": {months_order[month]: count
+                                       for month, count in sorted(self.transfers_by_month.items())},
+            },
+            "projects": project_reports,
+            "transfer_flows": [{"from": source, "to": target, "count": count}
+                               for (source, target), count in transfer_flows],
+        }
+
+
+def analyze_movement(entries, months_order: list) -> dict:
+    """
+    Строит отчёт о движении ИТР из кортежей (табельный номер, месяц, проект, группа должностей).
+
+    Записи с месяцами вне months_order пропускаются (о них сообщает проверка качества).
+    """
+    entries = list(entries)
+    analysis = MovementAnalysis(months_order, {entry[1] for entry in entries})
+    analysis.add(entries)
+    return analysis.report()
+
+
+def _correlation(pairs: list) -> dict:
+    pairs = [(x, y) for x, y in pairs if x is not None and y is not None]
+    if len(pairs) < 3:
+        return {"points": len(pairs), "pearson": None}
+    xs, ys = zip(*pairs)
+    try:
+        pearson = round(statistics.correlation(xs, ys), 3)
+    except statistics.StatisticsError:  # одно из значений постоянно
+        pearson = None
+    return {"points": len(pairs), "pearson": pearson}
+
+
+def relate_turnover_to_k(report: dict, projects_analysis: list, position_distribution: list) -> dict:
+    """
+    Дописывает в отчёт K проектов и должностей и корреляцию текучести с K.
+
+    K проекта — средняя численность рабочих / средняя численность ИТР за месяц,
+    K должности — K_median из position_distribution.
+    """
+    project_k = {
+        p['project']: round(p['workers_count_avg_monthly'] / p['itr_count_avg_monthly'], 1)
+        for p in projects_analysis if p['itr_count_avg_monthly']
+    }
+    position_k = {(p['project'], p['position_group']): p.get('K_median') for p in position_distribution}
+
+    project_pairs = []
+    position_pairs = []
+    for project_report in report["projects"]:
+        project = project_report["project"]
+        project_report["K"] = project_k.get(project)
+        project_pairs.append((project_report["avg_monthly_turnover"], project_report["K"]))
+        for position_report in project_report["positions"]:
+            position_report["K_median"] = position_k.get((project, position_report["position_group"]))
+            position_pairs.append((position_report["avg_monthly_turnover"], position_report["K_median"]))
+
+    report["turnover_vs_k"] = {
+        "projects": _correlation(project_pairs),
+        "positions": _correlation(position_pairs),
+    }
+    return report
@@ -12,11 +12,31 @@
 - Агрегируем через средневзвешенное (взвешенное по количеству рабочих)
 """
 
+import argparse
 import json
 import math
 from pathlib import Path
 from collections import defaultdict
 import statistics
+from array import array
+from typing import NamedTuple, Optional
+
+from background_io import (
+    DEFAULT_IO_WORKERS, COMPRESSION_SUFFIXES, BackgroundWriter, check_compressions, load_files_concurrently,
+)
+from checkpoints import CheckpointStore, input_fingerprint, to_plain
+from data_quality import TimesheetValidator
+from delta_publish import DeltaPublisher
+from export_public_dataset import (
+    build_compact_dataset, get_anonymization_key, verify_compact_dataset, ANONYMIZATION_KEY_ENV,
+)
+from out_of_core import (
+    PERSON_FIELDS, SpillPartitioner, estimate_partitions, iter_json_array, max_open_writers, personnel_key,
+)
+from personnel_movement import MovementAnalysis, analyze_movement, relate_turnover_to_k
+from rollup_cube import build_rollup_cube
+from staff_sharing import ALLOCATION_MODES, StaffSharingIndex
+from staffing_table import DEFAULT_MAX_WORKERS, build_staffing_tables, encode_staffing_tables
 
 
 def js_round(x: float) -> int:
@@ -29,12 +49,24 @@ def js_round(x: float) -> int:
 
 # Пути к файлам данных
 DATA_DIR = Path(__file__).parent.parent / "public" / "data"
-ITR_FILE = DATA_DIR / "itr_data_2025.json"
-WORKERS_FILE = DATA_DIR / "workers_data_2025.json"
+# Исходные табели с ФИО лежат вне public/ и в сборку сайта не попадают
+INPUT_DIR = Path(__file__).parent.parent / "data"
+ITR_FILE = INPUT_DIR / "itr_data_2025.json"
+WORKERS_FILE = INPUT_DIR / "workers_data_2025.json"
 PROJECTS_OUTPUT = DATA_DIR / "projects_analysis.json"
 POSITION_OUTPUT = DATA_DIR / "position_distribution.json"
 POSITION_NORMS_OUTPUT = DATA_DIR / "position_norms_by_scale.json"  # Новый файл со сводкой K
 MONTHLY_DETAILS_OUTPUT = DATA_DIR / "monthly_calculation_details.json"  # Детали помесячного расчёта
+QUALITY_REPORT_OUTPUT = DATA_DIR / "data_quality_report.json"  # Отчёт о качестве входных данных
+SHARED_STAFF_OUTPUT = DATA_DIR / "shared_staff_summary.json"  # ИТР-совместители по проектам и месяцам
+CALCULATOR_CONFIG_FILE = DATA_DIR / "calculator_config.json"
+STAFFING_TABLE_OUTPUT = DATA_DIR / "staffing_lookup.bin"  # Таблица численности для калькулятора
+COMPACT_ITR_OUTPUT = DATA_DIR / "itr_data_2025.compact.json"  # Анонимизированный табель ИТР для публикации
+MOVEMENT_OUTPUT = DATA_DIR / "personnel_movement.json"  # Стаж, переходы и текучесть ИТР
+ROLLUP_OUTPUT = DATA_DIR / "rollup_cube.json"  # Свёртки по стране, заказчику и площадке
+
+# Файлы, для которых между пересчётами публикуются патчи
+PUBLISHED_OUTPUTS = [PROJECTS_OUTPUT, POSITION_OUTPUT, POSITION_NORMS_OUTPUT, MONTHLY_DETAILS_OUTPUT]
 
 # Порядок месяцев
 MONTHS_ORDER = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
@@ -52,6 +84,76 @@ def get_project_scale(avg_workers: float) -> str:
         return "Very Large"
 
 
+class PositionMonthlyStats:
+    """
+    Помесячные показатели одной должности на проекте.
+
+    Вместо словаря на каждый месяц хранятся параллельные массивы значений
+    и суммы, которые накапливаются при добавлении месяца: средние и веса
+    не требуют повторных проходов по месяцам.
+    """
+    __slots__ = ('itr_counts', 'k_values', 'k_fte_values', 'weighted_itr_sum', 'total_weight',
+                 'k_hours_sum', 'hours_weight')
+
+    def __init__(self):
+        self.itr_counts = []  # int при учёте по численности, float при учёте долей часов
+        self.k_values = array('d')
+        self.k_fte_values = array('d')
+        self.weighted_itr_sum = 0
+        self.total_weight = 0
+        self.k_hours_sum = 0
+        self.hours_weight = 0
+
+    def add_month(self, itr_count, workers_count: int, itr_hours, K, K_fte) -> None:
+        self.itr_counts.append(itr_count)
+        self.weighted_itr_sum += itr_count * workers_count
+        self.total_weight += workers_count
+        if K is not None:
+            self.k_values.append(K)
+            self.k_hours_sum += K * itr_hours
+            self.hours_weight += itr_hours
+        if K_fte is not None:
+            self.k_fte_values.append(K_fte)
+
+
+class ProjectK(NamedTuple):
+    """K должности на одном проекте — вход для норм по масштабам."""
+    project: str
+    K_avg: float
+    K_median: float
+    K_fte_median: Optional[float]
+    K_hours_weighted: Optional[float]
+    avg_workers: float
+    months: int
+
+
+class ScaleKSummary:
+    """
+    Сводка K должности в одном масштабе, собранная одним проходом по проектам.
+
+    Используется и для печати, и для норм, и для деталей с выбросами.
+    """
+    __slots__ = ('projects_k', 'k_medians', 'k_avgs', 'weighted_k')
+
+    def __init__(self, projects_k: list):
+        self.projects_k = projects_k
+        self.k_medians = array('d')
+        self.k_avgs = array('d')
+        total_weight = 0
+        weighted_sum = 0
+        for p in projects_k:
+            self.k_medians.append(p.K_median)
+            self.k_avgs.append(p.K_avg)
+            total_weight += p.avg_workers
+            weighted_sum += p.K_median * p.avg_workers
+        # Взвешенное среднее K (взвешенное по avg_workers)
+        self.weighted_k = weighted_sum / total_weight if total_weight > 0 else 0
+
+
+# Фоновый писатель выходных файлов (--overlap-io); None — файлы пишутся сразу
+_output_writer = None
+
+
 def load_json(filepath: Path) -> list:
     """Загружает JSON файл."""
     with open(filepath, 'r', encoding='utf-8') as f:
@@ -60,10 +162,28 @@ def load_json(filepath: Path) -> list:
 
 def save_json(filepath: Path, data: list) -> None:
     """Сохраняет JSON файл с форматированием."""
+    if _output_writer is not None:
+        _output_writer.submit_json(filepath, data)
+        return
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 
+def save_compact_json(filepath: Path, data) -> None:
+    """Сохраняет JSON без отступов и пробелов (для файлов, которые грузит браузер)."""
+    if _output_writer is not None:
+        _output_writer.submit_json(filepath, data, compact=True)
+        return
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def flush_outputs() -> None:
+    """Дожидается записи всех файлов, отданных фоновому писателю."""
+    if _output_writer is not None:
+        _output_writer.flush()
+
+
 def detect_outliers_iqr(values: list, multiplier: float = 1.5) -> dict:
     """
     Определяет выбросы по методу IQR (Interquartile Range).
@@ -104,21 +224,19 @@ def detect_outliers_iqr(values: list, multiplier: float = 1.5) -> dict:
     }
 
 
-def calculate_monthly_stats():
-    """Основная функция расчёта помесячной статистики."""
-    print("Загрузка данных...")
-    itr_data = load_json(ITR_FILE)
-    workers_data = load_json(WORKERS_FILE)
-
-    print(f"  ITR записей: {len(itr_data)}")
-    print(f"  Workers записей: {len(workers_data)}")
+def group_records(itr_data: list, workers_data: list, validator=None) -> tuple:
+    """
+    Группирует записи ИТР и рабочих по проекту и месяцу.
 
+    Если передан validator (TimesheetValidator), каждая запись проверяется
+    в этом же проходе, без повторного чтения данных.
+    """
     # Группируем ITR по проекту и месяцу
     # Структура: {project: {month: {position_group: set(personnel_numbers)}}}
     itr_by_project_month = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
     itr_hours_by_project_month = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
 
-    for record in itr_data:
+    for row, record in enumerate(itr_data):
         project = record['project']
         month = record['month']
         position_group = record['position_group']
@@ -128,12 +246,15 @@ def calculate_monthly_stats():
         itr_by_project_month[project][month][position_group].add(personnel_number)
         itr_hours_by_project_month[project][month][position_group] += hours
 
+        if validator is not None:
+            validator.observe('itr', row, project, month, personnel_number, hours)
+
     # Группируем Workers по проекту и месяцу
     # Структура: {project: {month: set(personnel_numbers)}}
     workers_by_project_month = defaultdict(lambda: defaultdict(set))
     workers_hours_by_project_month = defaultdict(lambda: defaultdict(int))
 
-    for record in workers_data:
+    for row, record in enumerate(workers_data):
         project = record['project']
         month = record['month']
         personnel_number = record['personnel_number']
@@ -142,9 +263,36 @@ def calculate_monthly_stats():
         workers_by_project_month[project][month].add(personnel_number)
         workers_hours_by_project_month[project][month] += hours
 
+        if validator is not None:
+            validator.observe('workers', row, project, month, personnel_number, hours)
+
+    return (itr_by_project_month, itr_hours_by_project_month,
+            workers_by_project_month, workers_hours_by_project_month)
+
+
+def compute_project_stats(grouped: tuple, sharing: StaffSharingIndex = None,
+                          project_months: list = None) -> tuple:
+    """
+    Рассчитывает помесячную статистику по каждому проекту из сгруппированных данных.
+
+    Проекты независимы друг от друга, поэтому функцию можно вызывать
+    для любого подмножества проектов (например, для партиции при расчёте
+    вне памяти) и затем объединять результаты.
+
+    Если передан sharing (StaffSharingIndex), ИТР-совместители учитываются
+    на проекте долей своих часов, а не целым человеком.
+
+    Если передан project_months, в него дописываются помесячные строки
+    проектов (проект, месяц, рабочие, ИТР, часы рабочих, часы ИТР) —
+    из них строится куб свёрток по иерархии проектов.
+
+    Возвращает (projects_analysis, position_distribution, k_by_scale_position).
+    """
+    (itr_by_project_month, itr_hours_by_project_month,
+     workers_by_project_month, workers_hours_by_project_month) = grouped
+
     # Получаем все проекты
     all_projects = set(itr_by_project_month.keys()) | set(workers_by_project_month.keys())
-    print(f"\nВсего проектов: {len(all_projects)}")
 
     # Рассчитываем статистику для каждого проекта
     projects_analysis = []
@@ -162,8 +310,8 @@ def calculate_monthly_stats():
         monthly_itr_per_100 = []  # [(month, ratio, workers_count)]
 
         # Помесячная статистика по должностям
-        # {position_group: [(month, itr_count, workers_count, K)]}
-        position_monthly = defaultdict(list)
+        # {position_group: PositionMonthlyStats}
+        position_monthly = defaultdict(PositionMonthlyStats)
 
         for month in MONTHS_ORDER:
             workers_count = len(workers_by_project_month[project].get(month, set()))
@@ -179,17 +327,21 @@ def calculate_monthly_stats():
 
                 for position_group, personnel_set in itr_by_project_month[project].get(month, {}).items():
                     itr_count = len(personnel_set)
+                    if sharing is not None:
+                        itr_count = sharing.allocated_headcount(personnel_set, project, month)
+                    itr_hours = itr_hours_by_project_month[project][month][position_group]
                     itr_count_total += itr_count
-                    itr_hours_total += itr_hours_by_project_month[project][month][position_group]
+                    itr_hours_total += itr_hours
 
                     # K коэффициент для этой должности в этом месяце
                     K = workers_count / itr_count if itr_count > 0 else None
-                    position_monthly[position_group].append({
-                        'month': month,
-                        'itr_count': itr_count,
-                        'workers_count': workers_count,
-                        'K': K
-                    })
+                    # K по FTE: FTE рабочих / FTE ИТР (200 часов в месяц сокращаются)
+                    K_fte = workers_hours / itr_hours if itr_hours > 0 else None
+                    position_monthly[position_group].add_month(itr_count, workers_count, itr_hours, K, K_fte)
+
+                if project_months is not None:
+                    project_months.append((project, month, workers_count, itr_count_total,
+                                           workers_hours, itr_hours_total))
 
                 if itr_count_total > 0:
                     monthly_itr.append((month, itr_count_total))
@@ -260,32 +412,41 @@ def calculate_monthly_stats():
 
         # Формируем записи для position_distribution
         for position_group, monthly_data in position_monthly.items():
-            if not monthly_data:
+            if not monthly_data.itr_counts:
                 continue
 
-            # Считаем средневзвешенное количество ИТР этой должности
-            weighted_itr_sum = sum(d['itr_count'] * d['workers_count'] for d in monthly_data)
-            total_weight = sum(d['workers_count'] for d in monthly_data)
-            avg_itr_count = weighted_itr_sum / total_weight if total_weight > 0 else 0
+            # Средневзвешенное количество ИТР этой должности (суммы накоплены по месяцам)
+            total_weight = monthly_data.total_weight
+            avg_itr_count = monthly_data.weighted_itr_sum / total_weight if total_weight > 0 else 0
 
             # Медиана количества ИТР
-            itr_counts_pos = [d['itr_count'] for d in monthly_data]
-            median_itr_count = statistics.median(itr_counts_pos) if itr_counts_pos else 0
+            median_itr_count = statistics.median(monthly_data.itr_counts)
+
+            # K по FTE (только где есть часы ИТР)
+            k_fte_values = monthly_data.k_fte_values
+            avg_k_fte = statistics.mean(k_fte_values) if k_fte_values else None
+            median_k_fte = statistics.median(k_fte_values) if k_fte_values else None
+
+            # K по численности, взвешенный по часам ИТР этой должности
+            hours_weight = monthly_data.hours_weight
+            k_hours_weighted = monthly_data.k_hours_sum / hours_weight if hours_weight > 0 else None
 
             # K коэффициенты (только где есть ИТР)
-            k_values = [d['K'] for d in monthly_data if d['K'] is not None]
+            k_values = monthly_data.k_values
             if k_values:
                 avg_k = statistics.mean(k_values)
                 median_k = statistics.median(k_values)
 
                 # Добавляем в статистику по масштабам
-                k_by_scale_position[project_scale][position_group].append({
-                    'project': project,
-                    'K_avg': avg_k,
-                    'K_median': median_k,
-                    'avg_workers': avg_workers,
-                    'months': len(k_values)
-                })
+                k_by_scale_position[project_scale][position_group].append(ProjectK(
+                    project=project,
+                    K_avg=avg_k,
+                    K_median=median_k,
+                    K_fte_median=median_k_fte,
+                    K_hours_weighted=k_hours_weighted,
+                    avg_workers=avg_workers,
+                    months=len(k_values)
+                ))
             else:
                 avg_k = None
                 median_k = None
@@ -302,10 +463,361 @@ def calculate_monthly_stats():
                 "K_avg": round(avg_k, 1) if avg_k else None,
                 "K_median": round(median_k, 1) if median_k else None,
                 "project_scale": project_scale,
-                "avg_workers_monthly": round(avg_workers, 1)
+                "avg_workers_monthly": round(avg_workers, 1),
+                "K_fte_avg": round(avg_k_fte, 1) if avg_k_fte else None,
+                "K_fte_median": round(median_k_fte, 1) if median_k_fte else None,
+                "K_hours_weighted": round(k_hours_weighted, 1) if k_hours_weighted else None
             }
             position_distribution.append(position_record)
 
+    return projects_analysis, position_distribution, k_by_scale_position
+
+
+def print_quality_report(report: dict) -> None:
+    """Выводит краткую сводку отчёта о качестве данных."""
+    print(f"\nПроверка качества данных: найдено проблем {report['issues_total']}")
+    for issue, info in report['issues'].items():
+        print(f"  {info['description']}: {info['count']}")
+
+
+def save_sharing_summary(sharing: StaffSharingIndex) -> None:
+    """Сохраняет сводку по ИТР-совместителям (без табельных номеров)."""
+    summary = sharing.summary()
+    save_json(SHARED_STAFF_OUTPUT, summary)
+    print(f"  ИТР-совместителей (человеко-месяцев): {summary['shared_person_months']}, "
+          f"сводка в {SHARED_STAFF_OUTPUT.name}")
+
+
+def save_movement_report(report: dict, projects_analysis: list, position_distribution: list) -> None:
+    """Сохраняет отчёт о движении ИТР (стаж, переходы, текучесть) вместе с K проектов."""
+    relate_turnover_to_k(report, projects_analysis, position_distribution)
+    save_compact_json(MOVEMENT_OUTPUT, report)
+    summary = report['summary']
+    print(f"  Движение ИТР: {summary['people']} человек, {summary['transfers']} переходов, "
+          f"отчёт в {MOVEMENT_OUTPUT.name}")
+
+
+def run_stage(checkpoints: CheckpointStore, stage: str, compute, encode=None, decode=None):
+    """
+    Выполняет этап пересчёта или берёт его результат из контрольной точки.
+
+    Точка сохраняется только после того, как выходные файлы этапа записаны
+    на диск, чтобы продолжение не осталось без них.
+    """
+    if checkpoints is None:
+        return compute()
+
+    def compute_and_flush():
+        result = compute()
+        flush_outputs()
+        return result
+
+    return checkpoints.stage(stage, compute_and_flush, encode, decode)
+
+
+def save_rollup_cube(project_months: list) -> None:
+    """Сохраняет куб свёрток страна → заказчик → площадка → проект."""
+    cube = build_rollup_cube(project_months, MONTHS_ORDER)
+    save_compact_json(ROLLUP_OUTPUT, cube)
+    print(f"  Куб свёрток: {len(cube['nodes'])} узлов, сохранён в {ROLLUP_OUTPUT.name}")
+
+
+def load_and_group(concurrent_load: bool = False) -> tuple:
+    """
+    Загружает оба табеля, проверяет и группирует их, сохраняет отчёт
+    о качестве, компактный табель и сводку по совместителям.
+
+    Возвращает (grouped, StaffSharingIndex, отчёт о движении ИТР без K проектов).
+    """
+    print("Загрузка данных...")
+    if concurrent_load:
+        itr_data, workers_data = load_files_concurrently(load_json, [ITR_FILE, WORKERS_FILE])
+    else:
+        itr_data = load_json(ITR_FILE)
+        workers_data = load_json(WORKERS_FILE)
+
+    print(f"  ITR записей: {len(itr_data)}")
+    print(f"  Workers записей: {len(workers_data)}")
+
+    validator = TimesheetValidator(MONTHS_ORDER)
+    grouped = group_records(itr_data, workers_data, validator)
+
+    quality_report = validator.finalize()
+    print_quality_report(quality_report)
+    save_json(QUALITY_REPORT_OUTPUT, quality_report)
+    print(f"  Отчёт сохранён в {QUALITY_REPORT_OUTPUT.name}")
+
+    # Компактный анонимизированный табель ИТР для публикации вместо сырого файла
+    anonymization_key = get_anonymization_key()
+    if anonymization_key is not None:
+        save_compact_itr(itr_data, anonymization_key)
+    else:
+        print(f"  Экспорт компактного табеля пропущен: не задан {ANONYMIZATION_KEY_ENV} — "
+              f"табель ИТР не будет опубликован")
+
+    sharing = StaffSharingIndex.from_records(itr_data)
+    save_sharing_summary(sharing)
+
+    # В контрольную точку попадает готовый отчёт, а не записи табеля
+    movement = analyze_movement(((record['personnel_number'], record['month'], record['project'],
+                                  record['position_group']) for record in itr_data), MONTHS_ORDER)
+    return grouped, sharing, movement
+
+
+def save_compact_itr(itr_data: list, anonymization_key: bytes) -> None:
+    """Сохраняет компактный табель ИТР, если он без потерь воспроизводит исходные записи."""
+    try:
+        compact_itr = build_compact_dataset(itr_data, anonymization_key, MONTHS_ORDER)
+    except ValueError as e:
+        print(f"  Экспорт компактного табеля отменён: {e}")
+        return
+    if not verify_compact_dataset(compact_itr, itr_data):
+        print("  Экспорт компактного табеля отменён: набор расходится с исходными данными")
+        return
+    save_compact_json(COMPACT_ITR_OUTPUT, compact_itr)
+    print(f"  Компактный табель ИТР сохранён в {COMPACT_ITR_OUTPUT.name}")
+
+
+def encode_grouped_stage(stage: tuple) -> tuple:
+    grouped, sharing, movement = stage
+    return to_plain(grouped), sharing.shares, movement
+
+
+def decode_grouped_stage(value: tuple) -> tuple:
+    plain, shares, movement = value
+    plain_itr, plain_itr_hours, plain_workers, plain_workers_hours = plain
+
+    itr_by_project_month = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
+    itr_hours_by_project_month = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    workers_by_project_month = defaultdict(lambda: defaultdict(set))
+    workers_hours_by_project_month = defaultdict(lambda: defaultdict(int))
+    for target, source in ((itr_by_project_month, plain_itr), (itr_hours_by_project_month, plain_itr_hours),
+                           (workers_by_project_month, plain_workers),
+                           (workers_hours_by_project_month, plain_workers_hours)):
+        for project, months in source.items():
+            for month, value in months.items():
+                if isinstance(value, dict):
+                    target[project][month].update(value)
+                else:
+                    target[project][month] = value
+
+    grouped = (itr_by_project_month, itr_hours_by_project_month,
+               workers_by_project_month, workers_hours_by_project_month)
+    return grouped, StaffSharingIndex(shares), movement
+
+
+def compute_in_memory(itr_allocation: str = "headcount", concurrent_load: bool = False,
+                      project_months: list = None, checkpoints: CheckpointStore = None) -> tuple:
+    """
+    Расчёт статистики проектов с загрузкой обоих табелей в память целиком.
+
+    При concurrent_load табели читаются параллельно; в project_months
+    собираются помесячные строки проектов (см. compute_project_stats).
+    С checkpoints сгруппированные данные берутся из контрольной точки.
+    """
+    grouped, sharing, movement = run_stage(
+        checkpoints, "grouped", lambda: load_and_group(concurrent_load),
+        encode_grouped_stage, decode_grouped_stage)
+
+    all_projects_count = len(set(grouped[0]) | set(grouped[2]))
+    print(f"\nВсего проектов: {all_projects_count}")
+
+    projects_analysis, position_distribution, k_by_scale_position = compute_project_stats(
+        grouped, sharing if itr_allocation == "hours_share" else None, project_months)
+
+    save_movement_report(movement, projects_analysis, position_distribution)
+
+    return projects_analysis, position_distribution, k_by_scale_position
+
+
+def compute_out_of_core(memory_budget_mb: float, spill_dir: Path = None,
+                        itr_allocation: str = "headcount", project_months: list = None) -> tuple:
+    """
+    Расчёт статистики проектов вне памяти с заданным бюджетом (МБ).
+
+    Табели потоково читаются и раскладываются по партициям на диске
+    (все месяцы проекта — в одной партиции), затем каждая партиция
+    группируется и считается отдельно. Результаты упорядочиваются
+    так же, как при расчёте в памяти, поэтому выходные файлы совпадают.
+    """
+    n_partitions = estimate_partitions([ITR_FILE, WORKERS_FILE], memory_budget_mb)
+    print(f"Расчёт вне памяти: бюджет {memory_budget_mb} МБ, партиций {n_partitions}")
+
+    projects_analysis = []
+    position_distribution = []
+    k_by_scale_position = defaultdict(lambda: defaultdict(list))
+    all_projects_count = 0
+
+    # Колонки строк не накапливаются: дубли и совпадения ИТР с рабочими ищутся по партициям
+    validator = TimesheetValidator(MONTHS_ORDER, keep_rows=False)
+    # Месяцы табеля ИТР нужны анализу движения до первой партиции
+    itr_months = set()
+    # Две раскладки пишут одновременно: лимит открытых файлов делится между ними
+    open_writers = max_open_writers() // 2
+    with SpillPartitioner(n_partitions, spill_dir, max_open=open_writers) as spill, \
+            SpillPartitioner(n_partitions, spill_dir, PERSON_FIELDS, personnel_key,
+                             max_open=open_writers) as person_spill:
+        # Проверка качества идёт в том же потоковом проходе, что и раскладка по партициям
+        for row, record in enumerate(iter_json_array(ITR_FILE)):
+            validator.observe('itr', row, record['project'], record['month'],
+                              record['personnel_number'], record.get('hours', 0))
+            record['row'] = row
+            spill.add('itr', record)
+            person_spill.add('itr', record)
+            itr_months.add(record['month'])
+        for row, record in enumerate(iter_json_array(WORKERS_FILE)):
+            validator.observe('workers', row, record['project'], record['month'],
+                              record['personnel_number'], record.get('hours', 0))
+            record['row'] = row
+            spill.add('workers', record)
+            person_spill.add('workers', record)
+
+        print(f"  ITR записей: {spill.records_spilled['itr']}")
+        print(f"  Workers записей: {spill.records_spilled['workers']}")
+
+        # Все записи человека лежат в одной партиции по табельному номеру, поэтому
+        # совместителей и движение между проектами можно считать по партициям
+        partition_sharing = []
+        movement = MovementAnalysis(MONTHS_ORDER, itr_months)
+        for itr_keys, workers_keys in person_spill.partitions():
+            itr_keys = list(itr_keys)
+            validator.check_itr_and_worker(itr_keys, workers_keys)
+            partition_sharing.append(StaffSharingIndex.build(
+                (record['personnel_number'], record['month'], record['project'], record['hours'])
+                for record in itr_keys))
+            movement.add((record['personnel_number'], record['month'], record['project'],
+                          record['position_group']) for record in itr_keys)
+
+        sharing = StaffSharingIndex.merge(partition_sharing)
+        del partition_sharing
+        save_sharing_summary(sharing)
+        if itr_allocation != "hours_share":
+            sharing = None
+
+        for itr_records, workers_records in spill.partitions():
+            grouped = group_records(validator.iter_checking_duplicates('itr', itr_records),
+                                    validator.iter_checking_duplicates('workers', workers_records))
+            all_projects_count += len(set(grouped[0]) | set(grouped[2]))
+
+            part_projects, part_positions, part_k = compute_project_stats(grouped, sharing, project_months)
+            projects_analysis.extend(part_projects)
+            position_distribution.extend(part_positions)
+            for scale, positions_data in part_k.items():
+                for position_group, projects_k in positions_data.items():
+                    k_by_scale_position[scale][position_group].extend(projects_k)
+
+    quality_report = validator.finalize()
+    print_quality_report(quality_report)
+    save_json(QUALITY_REPORT_OUTPUT, quality_report)
+    print(f"  Отчёт сохранён в {QUALITY_REPORT_OUTPUT.name}")
+    print("  Экспорт компактного табеля пропущен: недоступен при расчёте вне памяти")
+
+    print(f"\nВсего проектов: {all_projects_count}")
+
+    # Восстанавливаем порядок проектов, как при расчёте в памяти:
+    # от него зависят сортировка с равными ключами и суммы с плавающей точкой
+    projects_analysis.sort(key=lambda x: x['project'])
+    for positions_data in k_by_scale_position.values():
+        for projects_k in positions_data.values():
+            projects_k.sort(key=lambda x: x.project)
+
+    save_movement_report(movement.report(), projects_analysis, position_distribution)
+
+    return projects_analysis, position_distribution, k_by_scale_position
+
+
+def calculate_monthly_stats(memory_budget_mb: float = None, spill_dir: Path = None,
+                            staffing_max_workers: int = DEFAULT_MAX_WORKERS,
+                            itr_allocation: str = "headcount", overlap_io: bool = False,
+                            io_workers: int = DEFAULT_IO_WORKERS, compress: list = (),
+                            checkpoint_dir: Path = None):
+    """
+    Основная функция расчёта помесячной статистики.
+
+    Если задан memory_budget_mb, данные обрабатываются вне памяти по партициям.
+    itr_allocation="hours_share" учитывает ИТР-совместителей долей часов.
+    overlap_io — табели читаются параллельно, а выходные файлы пишет фоновый
+    пул; compress — методы сжатых копий выходных файлов ("gzip", "br").
+    checkpoint_dir — каталог контрольных точек: после сбоя повторный запуск
+    продолжает с первого незавершённого этапа (сгруппированные данные,
+    статистика проектов, нормы по масштабам, детали с выбросами). При расчёте
+    вне памяти сгруппированные данные целиком не существуют, и первая точка —
+    статистика проектов.
+    """
+    global _output_writer
+    checkpoints = None
+    if checkpoint_dir is not None:
+        code_files = sorted(Path(__file__).parent.glob("*.py"))
+        fingerprint = input_fingerprint([ITR_FILE, WORKERS_FILE] + code_files,
+                                        {"itr_allocation": itr_allocation})
+        checkpoints = CheckpointStore(checkpoint_dir, fingerprint)
+
+    if overlap_io or compress:
+        _output_writer = BackgroundWriter(io_workers, compress)
+    try:
+        def compute_stats():
+            project_months = []
+            if memory_budget_mb is None:
+                stats = compute_in_memory(itr_allocation, concurrent_load=overlap_io,
+                                          project_months=project_months, checkpoints=checkpoints)
+            else:
+                stats = compute_out_of_core(memory_budget_mb, spill_dir, itr_allocation, project_months)
+            return (*stats, project_months)
+
+        projects_analysis, position_distribution, k_by_scale_position, project_months = run_stage(
+            checkpoints, "project_stats", compute_stats, encode_project_stats, decode_project_stats)
+
+        save_rollup_cube(project_months)
+
+        results = save_results(projects_analysis, position_distribution, k_by_scale_position,
+                               staffing_max_workers, checkpoints)
+        if _output_writer is not None:
+            _output_writer.close()
+        if checkpoints is not None:
+            checkpoints.clear()
+        return results
+    except BaseException:
+        if _output_writer is not None:
+            _output_writer.close_after_error()
+        raise
+    finally:
+        _output_writer = None
+
+
+def encode_project_stats(stage: tuple) -> tuple:
+    projects_analysis, position_distribution, k_by_scale_position, project_months = stage
+    k_plain = {
+        scale: {position_group: [tuple(p) for p in projects_k]
+                for position_group, projects_k in positions_data.items()}
+        for scale, positions_data in k_by_scale_position.items()
+    }
+    return projects_analysis, position_distribution, k_plain, project_months
+
+
+def decode_project_stats(value: tuple) -> tuple:
+    projects_analysis, position_distribution, k_plain, project_months = value
+    k_by_scale_position = defaultdict(lambda: defaultdict(list))
+    for scale, positions_data in k_plain.items():
+        for position_group, projects_k in positions_data.items():
+            k_by_scale_position[scale][position_group] = [ProjectK(*p) for p in projects_k]
+    return projects_analysis, position_distribution, k_by_scale_position, project_months
+
+
+def save_results(projects_analysis: list, position_distribution: list, k_by_scale_position: dict,
+                 staffing_max_workers: int = DEFAULT_MAX_WORKERS,
+                 checkpoints: CheckpointStore = None) -> tuple:
+    """
+    Формирует и сохраняет итоговые файлы из статистики проектов:
+    projects_analysis, position_distribution, сводку K по масштабам
+    и детали помесячного расчёта с выбросами.
+
+    С checkpoints нормы по масштабам и детали с выбросами берутся
+    из контрольных точек, если они уже посчитаны.
+    """
+    # Запоминаем прошлую версию файлов, чтобы выпустить патчи вместо полных файлов
+    publisher = DeltaPublisher(DATA_DIR, [path.name for path in PUBLISHED_OUTPUTS])
+    publisher.snapshot()
+
     # Сортируем projects_analysis по workers_count_avg_monthly (убывание)
     projects_analysis.sort(key=lambda x: x['workers_count_avg_monthly'], reverse=True)
 
@@ -320,6 +832,63 @@ def calculate_monthly_stats():
     save_json(POSITION_OUTPUT, position_distribution)
     print(f"  Сохранено {len(position_distribution)} записей в {POSITION_OUTPUT.name}")
 
+    # Сводка по каждой паре (масштаб, должность) считается один раз
+    scale_summaries = {
+        (scale, position_group): ScaleKSummary(projects_k)
+        for scale, positions_data in k_by_scale_position.items()
+        for position_group, projects_k in positions_data.items()
+        if projects_k
+    }
+
+    # Собираем все уникальные должности
+    all_positions = set()
+    for scale_data in k_by_scale_position.values():
+        all_positions.update(scale_data.keys())
+
+    position_norms_list = run_stage(checkpoints, "scale_aggregates",
+                                    lambda: build_scale_norms(k_by_scale_position, scale_summaries, all_positions))
+
+    # Сохраняем
+    save_json(POSITION_NORMS_OUTPUT, position_norms_list)
+    print(f"\n  Сохранено {len(position_norms_list)} должностей в {POSITION_NORMS_OUTPUT.name}")
+
+    # Выводим сводную таблицу
+    print("\n" + "="*60)
+    print("СВОДНАЯ ТАБЛИЦА K КОЭФФИЦИЕНТОВ (рекомендуемые)")
+    print("="*60)
+    print(f"\n{'Должность':<55} | {'S':>5} | {'M':>5} | {'L':>5} | {'XL':>5}")
+    print("-" * 85)
+
+    for position_data in position_norms_list:
+        pos_name = position_data['position_group'][:50]
+        scales = position_data['scales']
+        s = scales.get('Small', {}).get('recommended_K', '-')
+        m = scales.get('Medium', {}).get('recommended_K', '-')
+        l = scales.get('Large', {}).get('recommended_K', '-')
+        xl = scales.get('Very Large', {}).get('recommended_K', '-')
+        print(f"{pos_name:<55} | {str(s):>5} | {str(m):>5} | {str(l):>5} | {str(xl):>5}")
+
+    monthly_details = run_stage(checkpoints, "outlier_details",
+                                lambda: build_outlier_details(scale_summaries, all_positions))
+
+    # Сохраняем детальный файл
+    save_json(MONTHLY_DETAILS_OUTPUT, monthly_details)
+    print(f"\n  Сохранены детали расчёта в {MONTHLY_DETAILS_OUTPUT.name}")
+
+    # Предрассчитанная таблица численности для калькулятора
+    save_staffing_table(position_norms_list, staffing_max_workers)
+
+    # Патчи строятся по записанным файлам
+    flush_outputs()
+    manifest = publisher.publish()
+    latest = manifest['patches'][-1]['files'] if manifest['patches'] else []
+    print(f"  Версия публикации {manifest['version']}, изменённых файлов: {len(latest)}")
+
+    return projects_analysis, position_distribution, position_norms_list
+
+
+def build_scale_norms(k_by_scale_position: dict, scale_summaries: dict, all_positions: set) -> list:
+    """Печатает сводку K по масштабам и формирует нормы для position_norms_by_scale."""
     # Выводим сводную статистику по K коэффициентам
     print("\n" + "="*60)
     print("СВОДНАЯ СТАТИСТИКА K КОЭФФИЦИЕНТОВ ПО МАСШТАБАМ")
@@ -334,24 +903,20 @@ def calculate_monthly_stats():
             continue
 
         for position_group in sorted(positions_data.keys()):
-            projects_k = positions_data[position_group]
-            if not projects_k:
+            summary = scale_summaries.get((scale, position_group))
+            if summary is None:
                 continue
 
-            # Взвешенное среднее K (взвешенное по avg_workers)
-            total_weight = sum(p['avg_workers'] for p in projects_k)
-            weighted_k = sum(p['K_median'] * p['avg_workers'] for p in projects_k) / total_weight if total_weight > 0 else 0
-
             # Медиана K
-            k_medians = [p['K_median'] for p in projects_k]
+            k_medians = summary.k_medians
             overall_median_k = statistics.median(k_medians)
 
             min_k = min(k_medians)
             max_k = max(k_medians)
 
             print(f"\n  {position_group}:")
-            print(f"    Проектов: {len(projects_k)}")
-            print(f"    K средневзвеш: {weighted_k:.1f}")
+            print(f"    Проектов: {len(summary.projects_k)}")
+            print(f"    K средневзвеш: {summary.weighted_k:.1f}")
             print(f"    K медиана:     {overall_median_k:.1f}")
             print(f"    K диапазон:    {min_k:.1f} - {max_k:.1f}")
 
@@ -362,11 +927,6 @@ def calculate_monthly_stats():
 
     position_norms_by_scale = {}
 
-    # Собираем все уникальные должности
-    all_positions = set()
-    for scale_data in k_by_scale_position.values():
-        all_positions.update(scale_data.keys())
-
     for position_group in sorted(all_positions):
         position_norms_by_scale[position_group] = {
             "position_group": position_group,
@@ -374,51 +934,30 @@ def calculate_monthly_stats():
         }
 
         for scale in ["Small", "Medium", "Large", "Very Large"]:
-            positions_data = k_by_scale_position.get(scale, {})
-            if position_group in positions_data:
-                projects_k = positions_data[position_group]
-                k_medians = [p['K_median'] for p in projects_k]
-                k_avgs = [p['K_avg'] for p in projects_k]
-
-                if k_medians:
-                    # Взвешенное среднее K (взвешенное по avg_workers)
-                    total_weight = sum(p['avg_workers'] for p in projects_k)
-                    weighted_k = sum(p['K_median'] * p['avg_workers'] for p in projects_k) / total_weight if total_weight > 0 else 0
-
-                    position_norms_by_scale[position_group]["scales"][scale] = {
-                        "projects_count": len(projects_k),
-                        "K_median": round(statistics.median(k_medians), 1),
-                        "K_weighted": round(weighted_k, 1),
-                        "K_avg": round(statistics.mean(k_avgs), 1),
-                        "K_min": round(min(k_medians), 1),
-                        "K_max": round(max(k_medians), 1),
-                        "recommended_K": js_round(statistics.median(k_medians))  # Округление как в JS
-                    }
-                    print(f"  {position_group} [{scale}]: K={js_round(statistics.median(k_medians))} ({len(projects_k)} проектов)")
+            summary = scale_summaries.get((scale, position_group))
+            if summary is not None:
+                projects_k = summary.projects_k
+                k_medians = summary.k_medians
+                median_k = statistics.median(k_medians)
+
+                position_norms_by_scale[position_group]["scales"][scale] = {
+                    "projects_count": len(projects_k),
+                    "K_median": round(median_k, 1),
+                    "K_weighted": round(summary.weighted_k, 1),
+                    "K_avg": round(statistics.mean(summary.k_avgs), 1),
+                    "K_min": round(min(k_medians), 1),
+                    "K_max": round(max(k_medians), 1),
+                    "recommended_K": js_round(median_k),  # Округление как в JS
+                    **alternative_k_norms(projects_k)
+                }
+                print(f"  {position_group} [{scale}]: K={js_round(median_k)} ({len(projects_k)} проектов)")
 
     # Преобразуем в список для JSON
-    position_norms_list = list(position_norms_by_scale.values())
-
-    # Сохраняем
-    save_json(POSITION_NORMS_OUTPUT, position_norms_list)
-    print(f"\n  Сохранено {len(position_norms_list)} должностей в {POSITION_NORMS_OUTPUT.name}")
-
-    # Выводим сводную таблицу
-    print("\n" + "="*60)
-    print("СВОДНАЯ ТАБЛИЦА K КОЭФФИЦИЕНТОВ (рекомендуемые)")
-    print("="*60)
-    print(f"\n{'Должность':<55} | {'S':>5} | {'M':>5} | {'L':>5} | {'XL':>5}")
-    print("-" * 85)
+    return list(position_norms_by_scale.values())
 
-    for position_data in position_norms_list:
-        pos_name = position_data['position_group'][:50]
-        scales = position_data['scales']
-        s = scales.get('Small', {}).get('recommended_K', '-')
-        m = scales.get('Medium', {}).get('recommended_K', '-')
-        l = scales.get('Large', {}).get('recommended_K', '-')
-        xl = scales.get('Very Large', {}).get('recommended_K', '-')
-        print(f"{pos_name:<55} | {str(s):>5} | {str(m):>5} | {str(l):>5} | {str(xl):>5}")
 
+def build_outlier_details(scale_summaries: dict, all_positions: set) -> dict:
+    """Детали помесячного расчёта K по должностям и масштабам с выбросами по IQR."""
     # ============================================================
     # ДЕТАЛЬНЫЙ РАСЧЁТ ПО МЕСЯЦАМ С ВЫБРОСАМИ
     # ============================================================
@@ -445,34 +984,31 @@ def calculate_monthly_stats():
         }
 
         for scale in ["Small", "Medium", "Large", "Very Large"]:
-            positions_data = k_by_scale_position.get(scale, {})
-
-            if position_group not in positions_data:
+            summary = scale_summaries.get((scale, position_group))
+            if summary is None:
                 continue
 
-            projects_k = positions_data[position_group]
-            if not projects_k:
-                continue
+            projects_k = summary.projects_k
 
             # Все K медианы по проектам
-            k_medians = [p['K_median'] for p in projects_k]
+            k_medians = summary.k_medians
 
             # Определяем выбросы
             outlier_info = detect_outliers_iqr(k_medians)
 
             # Формируем детали по каждому проекту
             project_details = []
-            for proj_data in sorted(projects_k, key=lambda x: x['K_median']):
-                is_outlier = proj_data['K_median'] in outlier_info['outliers']
+            for proj_data in sorted(projects_k, key=lambda x: x.K_median):
+                is_outlier = proj_data.K_median in outlier_info['outliers']
 
                 project_details.append({
-                    "project": proj_data['project'],
-                    "K_median": round(proj_data['K_median'], 1),
-                    "K_avg": round(proj_data['K_avg'], 1),
-                    "avg_workers": round(proj_data['avg_workers'], 1),
-                    "months_with_data": proj_data['months'],
+                    "project": proj_data.project,
+                    "K_median": round(proj_data.K_median, 1),
+                    "K_avg": round(proj_data.K_avg, 1),
+                    "avg_workers": round(proj_data.avg_workers, 1),
+                    "months_with_data": proj_data.months,
                     "is_outlier": is_outlier,
-                    "outlier_type": "low" if is_outlier and proj_data['K_median'] < (outlier_info['lower_bound'] or 0) else ("high" if is_outlier else None)
+                    "outlier_type": "low" if is_outlier and proj_data.K_median < (outlier_info['lower_bound'] or 0) else ("high" if is_outlier else None)
                 })
 
             # Считаем статистику с и без выбросов
@@ -512,12 +1048,67 @@ def calculate_monthly_stats():
         if position_details["scales"]:
             monthly_details["positions"].append(position_details)
 
-    # Сохраняем детальный файл
-    save_json(MONTHLY_DETAILS_OUTPUT, monthly_details)
-    print(f"\n  Сохранены детали расчёта в {MONTHLY_DETAILS_OUTPUT.name}")
+    return monthly_details
 
-    return projects_analysis, position_distribution, position_norms_list
+
+def alternative_k_norms(projects_k: list) -> dict:
+    """Нормы масштаба по K на основе FTE и K, взвешенному по часам ИТР."""
+    norms = {}
+    for field, suffix in (('K_fte_median', 'K_fte'), ('K_hours_weighted', 'K_hours_weighted')):
+        values = [getattr(p, field) for p in projects_k if getattr(p, field) is not None]
+        median_value = statistics.median(values) if values else None
+        norms[f"{suffix}_median"] = round(median_value, 1) if values else None
+        norms[f"recommended_{suffix}"] = js_round(median_value) if values else None
+    return norms
+
+
+def save_staffing_table(position_norms_list: list, max_workers: int) -> None:
+    """Сохраняет таблицу рекомендуемой численности для 1..max_workers рабочих."""
+    calculator_config = load_json(CALCULATOR_CONFIG_FILE)
+    tables = build_staffing_tables(position_norms_list, calculator_config, max_workers, get_project_scale)
+    source = {
+        "position_norms": POSITION_NORMS_OUTPUT.name,
+        "calculator_config": CALCULATOR_CONFIG_FILE.name,
+    }
+    data = encode_staffing_tables(tables, max_workers, source)
+    if _output_writer is not None:
+        _output_writer.submit_bytes(STAFFING_TABLE_OUTPUT, data)
+    else:
+        STAFFING_TABLE_OUTPUT.write_bytes(data)
+    print(f"  Сохранена таблица численности (1..{max_workers} рабочих) в {STAFFING_TABLE_OUTPUT.name}")
 
 
 if __name__ == "__main__":
-    calculate_monthly_stats()
+    parser = argparse.ArgumentParser(description="Пересчёт помесячной статистики ИТР")
+    parser.add_argument("--memory-budget-mb", type=float, default=None,
+                        help="Считать вне памяти по партициям, укладываясь в бюджет (МБ)")
+    parser.add_argument("--spill-dir", type=Path, default=None,
+                        help="Каталог для временных файлов партиций (по умолчанию системный)")
+    parser.add_argument("--staffing-max-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Верхняя граница числа рабочих в таблице численности")
+    parser.add_argument("--itr-allocation", choices=ALLOCATION_MODES, default="headcount",
+                        help="Учёт ИТР-совместителей: целым человеком на каждом проекте "
+                             "или долей часов (hours_share)")
+    parser.add_argument("--overlap-io", action="store_true",
+                        help="Читать табели параллельно и писать выходные файлы в фоне")
+    parser.add_argument("--io-workers", type=int, default=DEFAULT_IO_WORKERS,
+                        help="Число потоков фоновой записи")
+    parser.add_argument("--compress", choices=list(COMPRESSION_SUFFIXES), action="append", default=[],
+                        help="Дописать сжатые копии выходных файлов (можно указать несколько раз)")
+    parser.add_argument("--checkpoint-dir", type=Path, default=None,
+                        help="Сохранять контрольные точки этапов и продолжать с них после сбоя")
+    args = parser.parse_args()
+    try:
+        check_compressions(args.compress)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.memory_budget_mb is not None and args.memory_budget_mb <= 0:
+        parser.error("--memory-budget-mb должен быть положительным")
+    if args.io_workers < 1:
+        parser.error("--io-workers должен быть не меньше 1")
+
+    calculate_monthly_stats(memory_budget_mb=args.memory_budget_mb, spill_dir=args.spill_dir,
+                            staffing_max_workers=args.staffing_max_workers,
+                            itr_allocation=args.itr_allocation, overlap_io=args.overlap_io,
+                            io_workers=args.io_workers, compress=args.compress,
+                            checkpoint_dir=args.checkpoint_dir)
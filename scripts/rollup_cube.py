@@ -0,0 +1,158 @@
+"""
+Свёртки показателей по иерархии страна → заказчик → площадка → проект.
+
+Имя проекта несёт структуру: "(RU) ВСМ(ПромАльп)-АГПЗ-Благо. (2025)" —
+страна RU, заказчик ВСМ (в скобках — вид работ), объект АГПЗ, площадка
+Благо.; в конце могут стоять пометка "АРК", период и номер очереди.
+
+Куб строится из помесячных строк проектов, которые уже собирает
+compute_project_stats: каждая строка один раз добавляется во все узлы
+над проектом, поэтому итоги любого узла за любой месяц — готовое значение,
+а переход вниз по иерархии — обращение к узлу по идентификатору
+("RU", "RU/ВСМ", "RU/ВСМ/Благо.", "RU/ВСМ/Благо./<проект>").
+
+Численность в узле — сумма численности проектов: человек, работавший
+на двух проектах узла, учтён на обоих, как и в итогах по проектам.
+K — рабочие / ИТР по суммам узла, K_weighted — K проектов, взвешенный
+по числу рабочих (как K_weighted в нормах по масштабам).
+"""
+
+import re
+from collections import defaultdict
+from typing import NamedTuple
+
+ROLLUP_LEVELS = ["country", "customer", "site", "project"]
+NODE_SEPARATOR = "/"
+UNKNOWN = "Не распознано"
+
+_PROJECT_NAME = re.compile(r"^\((?P<country>[^)]+)\)\s*(?P<body>.+)$")
+# Хвост имени: пометка арктической площадки, периоды и номера очередей в скобках
+_TRAILING_QUALIFIERS = re.compile(r"(\s+АРК|\s*\([^)]*\))+$")
+_WORK_TYPE = re.compile(r"\([^)]*\)")
+
+# Разные написания одного заказчика в именах проектов
+CUSTOMER_ALIASES = {
+    "Союз": "СОЮЗ",
+}
+
+
+class ProjectHierarchy(NamedTuple):
+    country: str
+    customer: str
+    site: str
+
+
+def parse_project_name(project: str) -> ProjectHierarchy:
+    """Страна, заказчик и площадка из имени проекта; нераспознанные части — UNKNOWN."""
+    match = _PROJECT_NAME.match(project.strip())
+    if match is None:
+        return ProjectHierarchy(UNKNOWN, UNKNOWN, UNKNOWN)
+
+    body = _TRAILING_QUALIFIERS.sub("", match.group("body")).strip()
+    parts = body.split("-")
+    if len(parts) < 3:
+        return ProjectHierarchy(match.group("country"), UNKNOWN, UNKNOWN)
+
+    customer = _WORK_TYPE.sub("", parts[0]).strip() or UNKNOWN
+    customer = CUSTOMER_ALIASES.get(customer, customer)
+    site = "-".join(parts[2:]).strip() or UNKNOWN
+    return ProjectHierarchy(match.group("country"), customer, site)
+
+
+def node_path(project: str) -> list:
+    """Идентификаторы узлов от страны до проекта."""
+    names = list(parse_project_name(project)) + [project]
+    return [NODE_SEPARATOR.join(names[:depth]) for depth in range(1, len(names) + 1)]
+
+
+class _Sums:
+    """Аддитивные суммы узла за месяц или за период."""
+    __slots__ = ('projects', 'workers', 'itr', 'workers_hours', 'itr_hours', 'k_weighted_sum', 'k_weight')
+
+    def __init__(self):
+        self.projects = 0
+        self.workers = 0
+        self.itr = 0
+        self.workers_hours = 0
+        self.itr_hours = 0
+        self.k_weighted_sum = 0
+        self.k_weight = 0
+
+    def add(self, workers, itr, workers_hours, itr_hours) -> None:
+        self.projects += 1
+        self.workers += workers
+        self.itr += itr
+        self.workers_hours += workers_hours
+        self.itr_hours += itr_hours
+        if itr > 0:
+            self.k_weighted_sum += workers / itr * workers
+            self.k_weight += workers
+
+    def metrics(self, months: int = 1) -> dict:
+        """Показатели узла; months — число месяцев для средних за период."""
+        return {
+            "projects": self.projects,
+            "workers": round(self.workers / months, 1),
+            "itr": round(self.itr / months, 1),
+            "workers_hours": self.workers_hours,
+            "itr_hours": self.itr_hours,
+            # FTE — 200 часов в месяц, как в projects_analysis
+            "workers_fte": round(self.workers_hours / 200 / months, 2),
+            "itr_fte": round(self.itr_hours / 200 / months, 2),
+            "K": round(self.workers / self.itr, 1) if self.itr else None,
+            "K_weighted": round(self.k_weighted_sum / self.k_weight, 1) if self.k_weight else None,
+        }
+
+
+def build_rollup_cube(project_months: list, months_order: list) -> dict:
+    """
+    Строит куб из строк (проект, месяц, рабочие, ИТР, часы рабочих, часы ИТР).
+
+    Для каждого узла хранятся показатели по месяцам и за период (средние
+    за месяц по численности и FTE, суммы часов, K).
+    """
+    month_index = {month: i for i, month in enumerate(months_order)}
+    # Порядок строк фиксирован, чтобы суммы с плавающей точкой не зависели от порядка расчёта
+    rows = sorted(project_months, key=lambda row: (row[0], month_index[row[1]]))
+
+    monthly = defaultdict(lambda: defaultdict(_Sums))
+    period = defaultdict(_Sums)
+    children = defaultdict(set)
+    node_months = defaultdict(set)
+    node_projects = defaultdict(set)
+
+    for project, month, workers, itr, workers_hours, itr_hours in rows:
+        path = node_path(project)
+        for depth, node in enumerate(path):
+            monthly[node][month].add(workers, itr, workers_hours, itr_hours)
+            period[node].add(workers, itr, workers_hours, itr_hours)
+            node_months[node].add(month)
+            node_projects[node].add(project)
+            if depth > 0:
+                children[path[depth - 1]].add(node)
+
+    data_months = {row[1] for row in rows}
+    nodes = {}
+    for node, sums in period.items():
+        names = node.split(NODE_SEPARATOR, len(ROLLUP_LEVELS) - 1)
+        months = [month for month in months_order if month in node_months[node]]
+        total = sums.metrics(len(months))
+        # За период — число разных проектов, а не проекто-месяцев
+        total["projects"] = len(node_projects[node])
+        total["months_active"] = len(months)
+        nodes[node] = {
+            "level": ROLLUP_LEVELS[len(names) - 1],
+            "name": names[-1],
+            "parent": NODE_SEPARATOR.join(names[:-1]) or None,
+            "children": sorted(children[node]),
+            "total": total,
+            "monthly": {month: monthly[node][month].metrics() for month in months},
+        }
+
+    return {
+        "levels": ROLLUP_LEVELS,
+        "separator": NODE_SEPARATOR,
+        "months": [month for month in months_order if month in data_months],
+        "roots": sorted(node for node in nodes if nodes[node]["parent"] is None),
+        "nodes": {node: nodes[node] for node in sorted(nodes)},
+    }
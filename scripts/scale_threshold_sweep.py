@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Перебор границ масштабов проекта (50/150/300 рабочих в get_project_scale).
+
+Все нормы в position_norms_by_scale.json зависят от этих границ. Полный
+пересчёт calculate_monthly_stats для каждого варианта не нужен: K_median
+и avg_workers проекта от границ не зависят. Скрипт считает их один раз,
+сортирует проекты каждой должности по avg_workers, и тогда масштаб при
+любых границах — непрерывный отрезок в этом порядке (находится bisect).
+Медиана, минимум и максимум K на отрезке берутся из дерева отрезков
+с отсортированными списками (порядковые статистики), средневзвешенное —
+из префиксных сумм.
+
+Использование:
+    python scripts/scale_threshold_sweep.py --small 30:70:10 --medium 100:200:25 --large 250:400:50
+    python scripts/scale_threshold_sweep.py --grid-file thresholds.json   # [[50, 150, 300], ...]
+"""
+
+import argparse
+import math
+import sys
+from bisect import bisect_left, bisect_right
+from itertools import product
+from pathlib import Path
+
+from recalculate_monthly_stats import (
+    DATA_DIR, ITR_FILE, WORKERS_FILE, compute_project_stats, group_records, js_round, load_json, save_json,
+)
+
+SCALES = ["Small", "Medium", "Large", "Very Large"]
+BASELINE_THRESHOLDS = (50, 150, 300)
+SWEEP_OUTPUT = DATA_DIR / "scale_threshold_sweep.json"
+
+
+class RangeOrderStatistics:
+    """
+    Порядковые статистики на отрезках массива (дерево отрезков из отсортированных списков).
+
+    kth(lo, hi, k) — k-е по возрастанию значение среди values[lo:hi]
+    за O(log^3 n) без копирования и сортировки отрезка.
+    """
+
+    def __init__(self, values: list):
+        self.n = len(values)
+        self.sorted_values = sorted(values)
+        size = 1
+        while size < max(self.n, 1):
+            size *= 2
+        self.size = size
+        self.tree = [[] for _ in range(2 * size)]
+        for i, value in enumerate(values):
+            self.tree[size + i] = [value]
+        for node in range(size - 1, 0, -1):
+            self.tree[node] = sorted(self.tree[2 * node] + self.tree[2 * node + 1])
+
+    def _count_le(self, lo: int, hi: int, value: float) -> int:
+        count = 0
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                count += bisect_right(self.tree[lo], value)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                count += bisect_right(self.tree[hi], value)
+            lo //= 2
+            hi //= 2
+        return count
+
+    def kth(self, lo: int, hi: int, k: int) -> float:
+        # Бинарный поиск по глобально отсортированным значениям
+        left, right = 0, self.n - 1
+        while left < right:
+            mid = (left + right) // 2
+            if self._count_le(lo, hi, self.sorted_values[mid]) > k:
+                right = mid
+            else:
+                left = mid + 1
+        return self.sorted_values[left]
+
+    def median(self, lo: int, hi: int) -> float:
+        """Медиана отрезка с той же семантикой, что statistics.median."""
+        count = hi - lo
+        if count % 2:
+            return self.kth(lo, hi, count // 2)
+        return (self.kth(lo, hi, count // 2 - 1) + self.kth(lo, hi, count // 2)) / 2
+
+
+class PositionSweep:
+    """Проекты одной должности, упорядоченные по avg_workers, с индексами для запросов."""
+
+    def __init__(self, projects_k: list):
+        projects_k = sorted(projects_k, key=lambda p: p.avg_workers)
+        self.avg_workers = [p.avg_workers for p in projects_k]
+        k_medians = [p.K_median for p in projects_k]
+        self.order_stats = RangeOrderStatistics(k_medians)
+
+        self.prefix_weighted = [0.0]
+        self.prefix_weight = [0.0]
+        for p in projects_k:
+            self.prefix_weighted.append(self.prefix_weighted[-1] + p.K_median * p.avg_workers)
+            self.prefix_weight.append(self.prefix_weight[-1] + p.avg_workers)
+
+    def scale_norms(self, thresholds: tuple) -> dict:
+        """Нормы K по масштабам при заданных границах (как в position_norms_by_scale)."""
+        # Масштаб — проекты с порог_слева <= avg_workers < порог_справа, как в get_project_scale
+        bounds = [0] + [bisect_left(self.avg_workers, t) for t in thresholds] + [len(self.avg_workers)]
+        norms = {}
+        for scale, lo, hi in zip(SCALES, bounds, bounds[1:]):
+            if hi <= lo:
+                continue
+            median_k = self.order_stats.median(lo, hi)
+            weight = self.prefix_weight[hi] - self.prefix_weight[lo]
+            weighted = (self.prefix_weighted[hi] - self.prefix_weighted[lo]) / weight if weight > 0 else 0
+            norms[scale] = {
+                "projects_count": hi - lo,
+                "K_median": round(median_k, 1),
+                "K_weighted": round(weighted, 1),
+                "K_min": round(self.order_stats.kth(lo, hi, 0), 1),
+                "K_max": round(self.order_stats.kth(lo, hi, hi - lo - 1), 1),
+                # Квартили по тем же индексам, что detect_outliers_iqr
+                "K_q1": round(self.order_stats.kth(lo, hi, (hi - lo) // 4), 1),
+                "K_q3": round(self.order_stats.kth(lo, hi, (3 * (hi - lo)) // 4), 1),
+                "recommended_K": js_round(median_k),
+            }
+        return norms
+
+
+def collect_project_k() -> dict:
+    """K_median и avg_workers по проектам для каждой должности (один полный расчёт)."""
+    grouped = group_records(load_json(ITR_FILE), load_json(WORKERS_FILE))
+    _, _, k_by_scale_position = compute_project_stats(grouped)
+
+    by_position = {}
+    for positions_data in k_by_scale_position.values():
+        for position_group, projects_k in positions_data.items():
+            by_position.setdefault(position_group, []).extend(projects_k)
+    return by_position
+
+
+def parse_range(text: str) -> list:
+    """'30:70:10' -> [30, 40, 50, 60, 70]; одно число — один вариант."""
+    parts = text.split(':')
+    if len(parts) not in (1, 3):
+        raise argparse.ArgumentTypeError(f"ожидается число или start:stop:step, получено {text!r}")
+    try:
+        parts = [float(part) for part in parts]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"не число в {text!r}") from None
+    if not all(math.isfinite(part) for part in parts):
+        raise argparse.ArgumentTypeError(f"границы и шаг должны быть конечными: {text!r}")
+    if len(parts) == 1:
+        start, stop, step = parts[0], parts[0], 1
+    else:
+        start, stop, step = parts
+        if step <= 0:
+            raise argparse.ArgumentTypeError(f"шаг должен быть больше нуля: {text!r}")
+    values = []
+    value = start
+    while value <= stop + 1e-9:
+        value = round(value, 6)
+        values.append(int(value) if value.is_integer() else value)
+        value += step
+    return values
+
+
+def build_grid(args) -> list:
+    if args.grid_file is not None:
+        grid = [tuple(t) for t in load_json(args.grid_file)]
+    else:
+        grid = list(product(args.small, args.medium, args.large))
+    # Текущие границы всегда первые: с ними сравниваются остальные варианты
+    grid = [t for t in grid if len(t) == 3 and t[0] < t[1] < t[2] and tuple(t) != BASELINE_THRESHOLDS]
+    return [BASELINE_THRESHOLDS] + grid
+
+
+def sweep(by_position: dict, grid: list) -> list:
+    sweeps = {position_group: PositionSweep(projects_k) for position_group, projects_k in by_position.items()}
+    results = []
+    baseline = None
+    for thresholds in grid:
+        positions = {position_group: position_sweep.scale_norms(thresholds)
+                     for position_group, position_sweep in sorted(sweeps.items())}
+        recommended = {(position_group, scale): norms["recommended_K"]
+                       for position_group, scales in positions.items()
+                       for scale, norms in scales.items()}
+        if baseline is None:
+            baseline = recommended
+
+        results.append({
+            "thresholds": list(thresholds),
+            # Сколько норм (должность, масштаб) изменилось относительно текущих границ
+            "recommended_K_changes": sum(1 for key, value in recommended.items() if baseline.get(key) != value)
+                                     + len(baseline.keys() - recommended.keys()),
+            "positions": positions,
+        })
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Перебор границ масштабов проекта")
+    parser.add_argument("--small", type=parse_range, default="50", help="Граница Small/Medium: число или start:stop:step")
+    parser.add_argument("--medium", type=parse_range, default="150", help="Граница Medium/Large: число или start:stop:step")
+    parser.add_argument("--large", type=parse_range, default="300", help="Граница Large/Very Large: число или start:stop:step")
+    parser.add_argument("--grid-file", type=Path, default=None, help="JSON со списком троек границ")
+    parser.add_argument("-o", "--output", type=Path, default=SWEEP_OUTPUT)
+    args = parser.parse_args()
+
+    grid = build_grid(args)
+    print(f"Вариантов границ: {len(grid)}")
+
+    by_position = collect_project_k()
+    results = sweep(by_position, grid)
+
+    save_json(args.output, {
+        "baseline_thresholds": list(BASELINE_THRESHOLDS),
+        "scales": SCALES,
+        "candidates": results,
+    })
+    print(f"  Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Индекс ИТР, работающих на нескольких проектах в одном месяце.
+
+По умолчанию специалист, отметивший часы на нескольких проектах за месяц,
+считается целым человеком на каждом из них: численность ИТР завышается,
+а K занижается. Индекс находит таких людей одной сортировкой записей по
+(табельный номер, месяц) и хранит для каждого долю его часов на каждом
+проекте. В режиме распределения по часам человек учитывается на проекте
+дробно — долей своих часов.
+
+Чтобы не просматривать записи заново для каждого проекта, индекс
+дополнительно раскладывает доли по (проект, месяц): цикл по проектам
+вычитает из len(personnel_set) только поправки совместителей.
+"""
+
+from collections import defaultdict
+from itertools import groupby
+
+from personnel_keys import personnel_sort_key
+
+ALLOCATION_MODES = ("headcount", "hours_share")
+
+
+def _person_month_key(entry: tuple) -> tuple:
+    return personnel_sort_key(entry[0]), entry[1]
+
+
+class StaffSharingIndex:
+    """
+    Доли часов совместителей: {(табельный номер, месяц): {проект: доля}}.
+
+    В индекс попадают только люди, работавшие в месяце больше чем на одном проекте.
+    """
+
+    def __init__(self, shares: dict):
+        self.shares = shares
+        self._by_project_month = defaultdict(list)
+        for (personnel_number, month), project_shares in shares.items():
+            for project, share in project_shares.items():
+                self._by_project_month[(project, month)].append((personnel_number, share))
+
+    @classmethod
+    def build(cls, entries) -> "StaffSharingIndex":
+        """
+        Строит индекс из кортежей (табельный номер, месяц, проект, часы)
+        одной сортировкой и одним проходом по соседним группам.
+        """
+        shares = {}
+        for ((_, personnel_number), month), group in groupby(sorted(entries, key=_person_month_key),
+                                                            key=_person_month_key):
+            hours_by_project = {}
+            for _, _, project, hours in group:
+                hours_by_project[project] = hours_by_project.get(project, 0) + hours
+            if len(hours_by_project) < 2:
+                continue
+
+            total_hours = sum(hours_by_project.values())
+            if total_hours > 0:
+                project_shares = {project: hours / total_hours for project, hours in hours_by_project.items()}
+            else:
+                # Без часов делим человека поровну между проектами
+                project_shares = {project: 1 / len(hours_by_project) for project in hours_by_project}
+            shares[(personnel_number, month)] = project_shares
+        return cls(shares)
+
+    @classmethod
+    def merge(cls, indexes) -> "StaffSharingIndex":
+        """
+        Объединяет индексы, построенные по непересекающимся наборам
+        (табельный номер, месяц), в том же порядке, что дал бы build по всем записям.
+        """
+        shares = {}
+        for index in indexes:
+            shares.update(index.shares)
+        return cls({key: shares[key] for key in sorted(shares, key=_person_month_key)})
+
+    @classmethod
+    def from_records(cls, itr_data) -> "StaffSharingIndex":
+        return cls.build((record['personnel_number'], record['month'], record['project'],
+                          record.get('hours', 0)) for record in itr_data)
+
+    def shared_in(self, project: str, month: str) -> list:
+        """Совместители проекта в месяце: [(табельный номер, доля часов)]."""
+        return self._by_project_month.get((project, month), [])
+
+    def allocated_headcount(self, personnel_set: set, project: str, month: str) -> float:
+        """Численность с учётом совместителей: каждый из них даёт долю своих часов вместо 1."""
+        count = len(personnel_set)
+        for personnel_number, share in self.shared_in(project, month):
+            if personnel_number in personnel_set:
+                count -= 1 - share
+        return count
+
+    def summary(self) -> dict:
+        """Сводка без табельных номеров: сколько совместителей по проектам и месяцам."""
+        by_project = defaultdict(dict)
+        for (project, month), entries in self._by_project_month.items():
+            by_project[project][month] = {
+                "shared_itr": len(entries),
+                "allocated_heads": round(sum(share for _, share in entries), 2),
+            }
+        return {
+            "shared_person_months": len(self.shares),
+            "projects": {project: by_project[project] for project in sorted(by_project)},
+        }
@@ -0,0 +1,181 @@
+"""
+Предрассчитанная таблица рекомендуемой численности ИТР по числу рабочих.
+
+Калькулятор пересчитывает численность при каждом изменении ввода, хотя
+результат зависит только от числа рабочих. Таблица заранее хранит
+рекомендуемую численность каждой группы должностей для всех значений
+от 1 до max_workers, так что любой запрос — это одно обращение по индексу.
+
+Два метода, как в калькуляторе:
+- "scale_k": ceil(workers / recommended_K) с K из position_norms_by_scale
+  для масштаба get_project_scale(workers); 0 — для масштаба нет нормы;
+- "proportional": ceil((workers / 100) * base_itr_per_100_workers * pct / 100)
+  по calculator_config.json, руководитель проекта — не меньше минимума.
+
+Бинарный формат (little-endian):
+    b"ITRS" | версия u16 | длина метаданных u32 | метаданные (JSON, UTF-8) | блоки
+Каждый блок — столбец одной группы должностей одного метода: разности
+соседних значений в кодировке zigzag-varint. Смещения блоков перечислены
+в метаданных. Читатель декодирует блоки один раз при загрузке.
+"""
+
+import json
+import math
+import struct
+from array import array
+from pathlib import Path
+
+STAFFING_MAGIC = b"ITRS"
+STAFFING_FORMAT_VERSION = 1
+DEFAULT_MAX_WORKERS = 2000
+
+PROJECT_MANAGER_GROUP = "Руководитель проекта"
+
+
+def scale_k_column(max_workers: int, k_by_scale: dict, get_scale) -> list:
+    """Численность по K масштаба для workers = 1..max_workers (как Math.ceil(workers / K))."""
+    column = []
+    for workers in range(1, max_workers + 1):
+        k = k_by_scale.get(get_scale(workers))
+        column.append(math.ceil(workers / k) if k else 0)
+    return column
+
+
+def proportional_column(max_workers: int, base_ratio: float, percentage: float,
+                        minimum: int = 0) -> list:
+    """Численность по доле группы, порядок операций как в ITRCalculator (calculator.ts)."""
+    column = []
+    for workers in range(1, max_workers + 1):
+        total_itr = (workers / 100) * base_ratio
+        count = math.ceil((total_itr * percentage) / 100)
+        column.append(max(count, minimum))
+    return column
+
+
+def build_staffing_tables(position_norms: list, calculator_config: dict,
+                          max_workers: int, get_scale) -> dict:
+    """
+    Строит таблицы {метод: {группа должностей: [численность для 1..max_workers]}}.
+
+    position_norms — список из position_norms_by_scale.json, recommended_K
+    в нём уже округлён js_round.
+    """
+    scale_k = {}
+    for position_data in position_norms:
+        k_by_scale = {scale: norms['recommended_K'] for scale, norms in position_data['scales'].items()}
+        scale_k[position_data['position_group']] = scale_k_column(max_workers, k_by_scale, get_scale)
+
+    base_ratio = calculator_config['base_itr_per_100_workers']
+    minimum_pm = calculator_config.get('minimum_project_manager', 0)
+    proportional = {}
+    for position_group, percentage in calculator_config['position_group_percentages'].items():
+        minimum = minimum_pm if position_group == PROJECT_MANAGER_GROUP else 0
+        proportional[position_group] = proportional_column(max_workers, base_ratio, percentage, minimum)
+
+    return {"scale_k": scale_k, "proportional": proportional}
+
+
+def _encode_deltas(column: list) -> bytes:
+    out = bytearray()
+    previous = 0
+    for value in column:
+        delta = value - previous
+        previous = value
+        zigzag = (delta << 1) ^ (delta >> 63)
+        while zigzag >= 0x80:
+            out.append((zigzag & 0x7F) | 0x80)
+            zigzag >>= 7
+        out.append(zigzag)
+    return bytes(out)
+
+
+def _decode_deltas(data: bytes, count: int) -> array:
+    column = array('l')
+    value = 0
+    pos = 0
+    for _ in range(count):
+        zigzag = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            zigzag |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        value += (zigzag >> 1) ^ -(zigzag & 1)
+        column.append(value)
+    return column
+
+
+def encode_staffing_tables(tables: dict, max_workers: int, source: dict) -> bytes:
+    """Сериализует таблицы в бинарный формат с дельта-кодированием столбцов."""
+    blocks = []
+    index = []
+    offset = 0
+    for method, columns in tables.items():
+        for position_group, column in columns.items():
+            block = _encode_deltas(column)
+            index.append({"method": method, "position_group": position_group,
+                          "offset": offset, "length": len(block)})
+            blocks.append(block)
+            offset += len(block)
+
+    metadata = json.dumps({
+        "max_workers": max_workers,
+        "source": source,
+        "columns": index,
+    }, ensure_ascii=False).encode('utf-8')
+
+    header = STAFFING_MAGIC + struct.pack('<HI', STAFFING_FORMAT_VERSION, len(metadata))
+    return header + metadata + b"".join(blocks)
+
+
+class StaffingTable:
+    """Читатель бинарной таблицы численности для пакетных потребителей."""
+
+    def __init__(self, data: bytes):
+        if data[:4] != STAFFING_MAGIC:
+            raise ValueError("Не файл таблицы численности")
+        version, metadata_length = struct.unpack_from('<HI', data, 4)
+        if version != STAFFING_FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата: {version}")
+
+        start = 4 + struct.calcsize('<HI')
+        metadata = json.loads(data[start:start + metadata_length].decode('utf-8'))
+        blocks_start = start + metadata_length
+
+        self.max_workers = metadata['max_workers']
+        self.source = metadata['source']
+        self.columns = {}
+        for entry in metadata['columns']:
+            block_start = blocks_start + entry['offset']
+            block = data[block_start:block_start + entry['length']]
+            self.columns.setdefault(entry['method'], {})[entry['position_group']] = \
+                _decode_deltas(block, self.max_workers)
+
+    @classmethod
+    def load(cls, filepath: Path) -> "StaffingTable":
+        return cls(Path(filepath).read_bytes())
+
+    def position_groups(self, method: str = "scale_k") -> list:
+        return list(self.columns[method])
+
+    def recommended(self, workers: int, position_group: str, method: str = "scale_k") -> int:
+        """Рекомендуемая численность группы; None — вне диапазона или нет нормы."""
+        if not 1 <= workers <= self.max_workers:
+            return None
+        column = self.columns[method].get(position_group)
+        if column is None:
+            return None
+        count = column[workers - 1]
+        if method == "scale_k" and count == 0:
+            return None
+        return count
+
+    def breakdown(self, workers: int, method: str = "scale_k") -> dict:
+        """Численность всех групп должностей для заданного числа рабочих."""
+        return {
+            position_group: self.recommended(workers, position_group, method)
+            for position_group in self.columns[method]
+        }
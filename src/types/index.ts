@@ -132,6 +132,91 @@ export interface MonthlyDynamics {
   monthly_dynamics: MonthlyDynamicsRecord[];
 }
 
+// Personnel Movement Types
+export interface MovementMonth {
+  month: string;
+  headcount: number;
+  joined: number;
+  left: number;
+  turnover_rate: number | null;
+}
+
+export interface MovementStats {
+  people: number;
+  spans: number;
+  ongoing_spans: number;
+  avg_tenure_months: number;
+  median_tenure_months: number;
+  avg_monthly_turnover: number | null;
+  monthly: MovementMonth[];
+}
+
+export interface PositionMovement extends MovementStats {
+  position_group: string;
+  K_median: number | null;
+}
+
+export interface ProjectMovement extends MovementStats {
+  project: string;
+  transfers_in: number;
+  transfers_out: number;
+  K: number | null;
+  positions: PositionMovement[];
+}
+
+export interface TurnoverCorrelation {
+  points: number;
+  pearson: number | null;
+}
+
+export interface PersonnelMovement {
+  months: string[];
+  summary: {
+    people: number;
+    spans: number;
+    avg_tenure_months: number;
+    median_tenure_months: number;
+    transfers: number;
+    transfers_by_month: Record<string, number>;
+  };
+  projects: ProjectMovement[];
+  transfer_flows: { from: string; to: string; count: number }[];
+  turnover_vs_k: {
+    projects: TurnoverCorrelation;
+    positions: TurnoverCorrelation;
+  };
+}
+
+// Rollup Cube Types
+export interface RollupMetrics {
+  projects: number;
+  workers: number;
+  itr: number;
+  workers_hours: number;
+  itr_hours: number;
+  workers_fte: number;
+  itr_fte: number;
+  K: number | null;
+  K_weighted: number | null;
+}
+
+export interface RollupNode {
+  level: 'country' | 'customer' | 'site' | 'project';
+  name: string;
+  parent: string | null;
+  children: string[];
+  total: RollupMetrics & { months_active: number };
+  monthly: Record<string, RollupMetrics>;
+}
+
+export interface RollupCube {
+  levels: string[];
+  separator: string;
+  months: string[];
+  roots: string[];
+  nodes: Record<string, RollupNode>;
+}
+
 // Data Statistics Types
 export interface DataStatistics {
   itr_data: {
@@ -5,6 +5,8 @@ import type {
   PositionDistribution,
   ScaleBasedStandards,
   MonthlyDynamics,
+  PersonnelMovement,
+  RollupCube,
 } from '../types';
 
 export async function loadCompanyStandards(): Promise<CompanyStandards> {
@@ -54,3 +56,19 @@ export async function loadMonthlyDynamics(): Promise<MonthlyDynamics> {
   }
   return response.json();
 }
+
+export async function loadPersonnelMovement(): Promise<PersonnelMovement> {
+  const response = await fetch('/data/personnel_movement.json');
+  if (!response.ok) {
+    throw new Error('Failed to load personnel movement');
+  }
+  return response.json();
+}
+
+export async function loadRollupCube(): Promise<RollupCube> {
+  const response = await fetch('/data/rollup_cube.json');
+  if (!response.ok) {
+    throw new Error('Failed to load rollup cube');
+  }
+  return response.json();
+}